@@ -0,0 +1,63 @@
+"""
+Measures cold start time of the component actions, every measurement runs in a fresh interpreter.
+Actions which do not call the Bing Ads API are run end to end, for the others only the modules they load
+are imported. Run from the repository root, e.g. `python scripts/benchmark_cold_start.py --repeat 10`.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+SRC_DIRECTORY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+
+# actions run end to end: action -> configuration parameters
+OFFLINE_ACTIONS = {
+    "get_bulk_entities": {},
+    "get_report_columns": {"report_settings_custom": {"report_type": "CampaignPerformance"}},
+}
+# actions calling the API: action -> modules imported by the action
+ONLINE_ACTIONS = {
+    "get_accounts": ["component", "bingads_wrapper.authorization", "bingads_wrapper.customer_management"],
+    "get_customers": ["component", "bingads_wrapper.authorization", "bingads_wrapper.customer_management"],
+    "run": ["component", "bingads_wrapper.authorization", "bingads_wrapper.reporting", "bingads_wrapper.request"],
+}
+
+
+def measure(command: list[str], env: dict) -> float:
+    start = time.perf_counter()
+    subprocess.run(command, env=env, cwd=SRC_DIRECTORY, check=True, stdout=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+
+def benchmark_offline_action(action: str, parameters: dict, repeat: int) -> list[float]:
+    with tempfile.TemporaryDirectory() as data_directory:
+        with open(os.path.join(data_directory, "config.json"), 'w') as f:
+            json.dump({"action": action, "parameters": parameters}, f)
+        env = {**os.environ, "KBC_DATADIR": data_directory}
+        return [measure([sys.executable, "component.py"], env) for _ in range(repeat)]
+
+
+def benchmark_imports(modules: list[str], repeat: int) -> list[float]:
+    command = [sys.executable, "-c", "; ".join(f"import {module}" for module in modules)]
+    env = {**os.environ, "PYTHONPATH": SRC_DIRECTORY}
+    return [measure(command, env) for _ in range(repeat)]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=5, help="number of measurements of every action")
+    args = parser.parse_args()
+
+    baseline = benchmark_imports(["sys"], args.repeat)
+    print(f"{'interpreter start-up':<24} median {statistics.median(baseline):.3f} s, min {min(baseline):.3f} s")
+    for action, parameters in OFFLINE_ACTIONS.items():
+        durations = benchmark_offline_action(action, parameters, args.repeat)
+        print(f"{action:<24} median {statistics.median(durations):.3f} s, min {min(durations):.3f} s")
+    for action, modules in ONLINE_ACTIONS.items():
+        durations = benchmark_imports(modules, args.repeat)
+        print(f"{action + ' (imports)':<24} median {statistics.median(durations):.3f} s,"
+              f" min {min(durations):.3f} s")
@@ -0,0 +1,14 @@
+"""
+Generates the metadata index (report columns, bulk entities and campaign types) of the installed bingads SDK,
+so sync actions do not have to parse the service WSDLs. Run from the repository root.
+"""
+import json
+import sys
+
+sys.path.insert(0, "src")
+
+from bingads_wrapper.metadata_provider import METADATA_INDEX_PATH, create_metadata_index  # noqa: E402
+
+if __name__ == '__main__':
+    with open(METADATA_INDEX_PATH, 'w', encoding='utf-8') as out_f:
+        json.dump(create_metadata_index(), out_f, separators=(',', ':'))
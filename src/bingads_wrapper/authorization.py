@@ -1,5 +1,8 @@
+import copy
 from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
 import logging
+import threading
 from typing import Callable, Literal, Optional
 import webbrowser
 
@@ -13,6 +16,9 @@ from keboola.component.dao import OauthCredentials
 KEY_DEVELOPER_TOKEN = "#developer_token"
 KEY_ENVIRONMENT = "environment"
 
+# access token is refreshed when it expires in less than this
+ACCESS_TOKEN_REFRESH_MARGIN = timedelta(minutes=5)
+
 
 def request_user_consent(authentication: OAuthWithAuthorizationCode):
     webbrowser.open(authentication.get_authorization_endpoint(), new=1)
@@ -46,7 +52,11 @@ class Authorization:
     environment: Literal["sandbox", "production"] = field(init=False)
     refresh_token: str = field(init=False)
 
+    # shared by all copies created by for_account, so that the token is refreshed only once
+    _token_refresh_lock: threading.Lock = field(init=False)
+
     def __post_init__(self):
+        self._token_refresh_lock = threading.Lock()
         self.client_id = self.oauth_credentials.appKey
         self.client_secret = self.oauth_credentials.appSecret
         self.refresh_token: Optional[str] = self.oauth_credentials.data.get("refresh_token")
@@ -86,6 +96,38 @@ class Authorization:
             authentication=authentication,
         )
 
+    def for_account(self, account_id: int) -> "Authorization":
+        """
+        Returns authorization for the specified account reusing the OAuth tokens of this authorization,
+        so no further calls to the token endpoint are made.
+        """
+        account_authorization = copy.copy(self)
+        account_authorization.account_id = account_id
+        account_authorization.authorization_data = AuthorizationData(
+            account_id=account_id,
+            customer_id=self.customer_id,
+            developer_token=self.developer_token,
+            authentication=self.authorization_data.authentication,
+        )
+        return account_authorization
+
+    def refresh_access_token_if_expiring(self) -> None:
+        """
+        Refreshes the shared OAuth access token if it is about to expire.
+        """
+        with self._token_refresh_lock:
+            authentication = self.authorization_data.authentication
+            oauth_tokens: OAuthTokens = authentication.oauth_tokens
+            if not oauth_tokens or not oauth_tokens.access_token_expires_in_seconds:
+                return
+            expires_at = (oauth_tokens.access_token_received_datetime
+                          + timedelta(seconds=oauth_tokens.access_token_expires_in_seconds))
+            # the SDK uses naive UTC datetimes
+            if expires_at - datetime.now(timezone.utc).replace(tzinfo=None) > ACCESS_TOKEN_REFRESH_MARGIN:
+                return
+            logging.info("Access token is about to expire, refreshing it.")
+            authentication.request_oauth_tokens_by_refresh_token(oauth_tokens.refresh_token)
+
     def save_refresh_token(self, oauth_tokens: OAuthTokens) -> None:
         """
         Save the refresh token in the state file.
@@ -1,20 +1,47 @@
+import csv
 import logging
+import os
 from datetime import datetime, timedelta, timezone
+from enum import Enum, unique
 from typing import List, Optional
 
+import backoff
+from bingads.service_client import ServiceClient
 from bingads.v13.bulk import DownloadParameters
+from suds import WebFault
 
+from . import metadata_provider
+from .authorization import Authorization
+from .error_handling import RETRIABLE_ERRORS, process_webfault_errors
+from .snapshot import KEY_SNAPSHOT_MODE, SnapshotMode
+from .transport import create_transport
 from .utils import comma_separated_str_to_list
 
 KEY_DATA_SCOPE = "data_scope"
 KEY_DOWNLOAD_ENTITIES = "download_entities"
 KEY_SINCE_LAST_SYNC_TIME = "since_last_sync_time"
+KEY_SHARD_MODE = "shard_mode"
+KEY_ENTITIES_PER_SHARD = "entities_per_shard"
+KEY_CAMPAIGNS_PER_SHARD = "campaigns_per_shard"
 
 MAX_COMPONENT_RUNTIME_SECONDS = 14400
 DOWNLOAD_REQUEST_TIMEOUT_PERIOD_MILLISECONDS = (MAX_COMPONENT_RUNTIME_SECONDS - 400) * 1000
 OVERWRITE_RESULT_FILE = True
 DEFAULT_DATA_SCOPE = ["EntityData"]
 DATA_SCOPES_INCOMPATIBLE_WITH_LAST_SYNC_TIME = {"QualityScoreData", "BidSuggestionsData"}
+DEFAULT_ENTITIES_PER_SHARD = 1
+DEFAULT_CAMPAIGNS_PER_SHARD = 100
+MAX_CAMPAIGNS_PER_SHARD = 1000
+TYPE_COLUMN = "Type"
+ID_COLUMN = "Id"
+CAMPAIGN_COLUMN = "Campaign"
+
+
+@unique
+class ShardMode(Enum):
+    NONE = "none"
+    ENTITY_GROUPS = "entity_groups"
+    CAMPAIGNS = "campaigns"
 
 
 def _get_last_sync_time_argument(config_dict: dict, data_scope: List[str],
@@ -25,7 +52,8 @@ def _get_last_sync_time_argument(config_dict: dict, data_scope: List[str],
     elif not last_sync_time_in_utc:
         logging.warning(
             '"Only download changes since the last run" option is used, but no last run timestamp was found'
-            ' (probably caused by this being the first run of this configuration row). Will download all data.')
+            ' (probably caused by this being the first run of this configuration row or of this account).'
+            ' Will download all data.')
         return None
     incompatible_data_scope_elements = DATA_SCOPES_INCOMPATIBLE_WITH_LAST_SYNC_TIME.intersection(data_scope)
     if incompatible_data_scope_elements:
@@ -39,26 +67,29 @@ def _get_last_sync_time_argument(config_dict: dict, data_scope: List[str],
     return last_sync_time_in_utc
 
 
+def get_download_entities(config_dict: dict) -> List[str]:
+    # backward compatibility with first ui version
+    if isinstance(config_dict[KEY_DOWNLOAD_ENTITIES], str):
+        return comma_separated_str_to_list(config_dict[KEY_DOWNLOAD_ENTITIES])
+    return list(config_dict[KEY_DOWNLOAD_ENTITIES])
+
+
 def create_download_parameters(
         config_dict: dict,
         last_sync_time_in_utc: Optional[datetime],
         result_file_directory: str,
         result_file_name: str,
         report_file_format: str,
+        download_entities: Optional[List[str]] = None,
+        campaign_ids: Optional[List[int]] = None,
 ) -> DownloadParameters:
     data_scope: List[str] = (comma_separated_str_to_list(config_dict[KEY_DATA_SCOPE])
                              if config_dict.get(KEY_DATA_SCOPE) else DEFAULT_DATA_SCOPE)
 
-    # backward compatibility with first ui version
-    if isinstance(config_dict[KEY_DOWNLOAD_ENTITIES], str):
-        download_entities: List[str] = comma_separated_str_to_list(config_dict[KEY_DOWNLOAD_ENTITIES])
-    elif isinstance(config_dict[KEY_DOWNLOAD_ENTITIES], list):
-        download_entities: List[str] = config_dict[KEY_DOWNLOAD_ENTITIES]
-
     return DownloadParameters(
-        campaign_ids=None,
+        campaign_ids=campaign_ids,
         data_scope=data_scope,
-        download_entities=download_entities,
+        download_entities=download_entities or get_download_entities(config_dict),
         file_type=report_file_format,
         last_sync_time_in_utc=_get_last_sync_time_argument(config_dict, data_scope, last_sync_time_in_utc),
         result_file_directory=result_file_directory,
@@ -68,5 +99,93 @@ def create_download_parameters(
     )
 
 
+def get_shards(config_dict: dict, authorization: Authorization,
+               is_delta: bool) -> List[tuple[Optional[List[str]], Optional[List[int]]]]:
+    """
+    Returns download entities and campaign IDs of bulk downloads the download of the account is split into,
+    an empty list if it should not be split.
+    """
+    shard_mode = ShardMode(config_dict.get(KEY_SHARD_MODE, ShardMode.NONE.value))
+    snapshot_mode = SnapshotMode(config_dict.get(KEY_SNAPSHOT_MODE, SnapshotMode.DISABLED.value))
+    if shard_mode is ShardMode.CAMPAIGNS and (is_delta or snapshot_mode is not SnapshotMode.DISABLED):
+        # deleted campaigns are not listed, so their deletions would be missing in the changes and the snapshot
+        logging.warning(f"Bulk download of account {authorization.account_id} is not split by campaigns,"
+                        f" splitting by campaigns cannot be used for changes since the last run or with the entity"
+                        f" snapshot.")
+        return []
+    if shard_mode is ShardMode.ENTITY_GROUPS:
+        download_entities = get_download_entities(config_dict)
+        group_size = max(1, int(config_dict.get(KEY_ENTITIES_PER_SHARD) or DEFAULT_ENTITIES_PER_SHARD))
+        shards = [(download_entities[i:i + group_size], None) for i in range(0, len(download_entities), group_size)]
+    elif shard_mode is ShardMode.CAMPAIGNS:
+        campaign_ids = get_campaign_ids(authorization)
+        batch_size = min(MAX_CAMPAIGNS_PER_SHARD,
+                         max(1, int(config_dict.get(KEY_CAMPAIGNS_PER_SHARD) or DEFAULT_CAMPAIGNS_PER_SHARD)))
+        shards = [(None, campaign_ids[i:i + batch_size]) for i in range(0, len(campaign_ids), batch_size)]
+    else:
+        return []
+    if len(shards) < 2:
+        return []
+    logging.info(f"Bulk download of account {authorization.account_id} is split into {len(shards)} shards.")
+    return shards
+
+
+@backoff.on_exception(backoff.expo, RETRIABLE_ERRORS, max_tries=5)
+def get_campaign_ids(authorization: Authorization) -> List[int]:
+    """
+    Returns IDs of all campaigns (of all campaign types) of the account of the authorization.
+    """
+    authorization.refresh_access_token_if_expiring()
+    campaign_service = ServiceClient(
+        service="CampaignManagementService",
+        version=13,
+        authorization_data=authorization.authorization_data,
+        environment=authorization.environment,
+        transport=create_transport(authorization.developer_token, authorization.customer_id),
+    )
+    try:
+        campaigns = campaign_service.GetCampaignsByAccountId(
+            AccountId=authorization.authorization_data.account_id,
+            CampaignType=" ".join(metadata_provider.get_campaign_types()))
+    except WebFault as ex:
+        process_webfault_errors(ex)
+    return [campaign.Id for campaign in campaigns.Campaign] if campaigns else []
+
+
+def merge_bulk_files(src_paths: List[str], dst_path: str):
+    """
+    Concatenates bulk files of shards of a single account, the header is kept only from the first file.
+    Entities not belonging to a campaign (format version, account, budgets, labels, shared lists, ...)
+    are repeated in the files of all shards, they are kept only once, identified by Type and Id. Entities
+    of a campaign are in a single shard only, so their keys are not held in memory.
+    """
+    with open(dst_path, 'w', encoding='utf-8', newline='') as dst_f:
+        writer = csv.writer(dst_f, lineterminator="\r\n")
+        header_line = None
+        seen_keys = set()
+        for src_path in src_paths:
+            if not os.path.exists(src_path):
+                continue
+            # the byte order mark is kept as a part of the header line
+            with open(src_path, 'r', encoding='utf-8', newline='') as src_f:
+                if header_line is None:
+                    header_line = src_f.readline()
+                    dst_f.write(header_line)
+                    columns = next(csv.reader([header_line.removeprefix("\ufeff")]))
+                    type_index, id_index = columns.index(TYPE_COLUMN), columns.index(ID_COLUMN)
+                    campaign_index = columns.index(CAMPAIGN_COLUMN) if CAMPAIGN_COLUMN in columns else None
+                elif src_f.readline() != header_line:
+                    raise ValueError("Bulk files of the shards have different columns.")
+                for row in csv.reader(src_f):
+                    if not row:
+                        continue
+                    if campaign_index is None or not row[campaign_index]:
+                        key = (row[type_index], row[id_index])
+                        if key in seen_keys:
+                            continue
+                        seen_keys.add(key)
+                    writer.writerow(row)
+
+
 def create_primary_key() -> List[str]:
     return ["Type", "Id"]
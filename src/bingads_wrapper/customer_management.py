@@ -1,4 +1,7 @@
-from dataclasses import dataclass
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Optional
 
 from bingads.service_client import ServiceClient
 
@@ -6,24 +9,40 @@ from suds import WebFault
 
 from .authorization import Authorization
 from .error_handling import process_webfault_errors
+from .transport import create_transport
+
+# maximum number of concurrent GetCustomer calls
+GET_CUSTOMER_PARALLELISM = 8
 
 
 @dataclass(slots=True)
 class CustomerManagementServiceClient:
     authorization: Authorization
 
-    def get_user(self):
-        """
-        Get the authenticated user.
-        """
-        customer_service = ServiceClient(
+    # created on first use and reused by all calls, building the client parses the service WSDL
+    _service_client: Optional[ServiceClient] = field(init=False, default=None)
+
+    @property
+    def service_client(self) -> ServiceClient:
+        if self._service_client is None:
+            self._service_client = self._create_service_client()
+        return self._service_client
+
+    def _create_service_client(self) -> ServiceClient:
+        return ServiceClient(
             service="CustomerManagementService",
             version=13,
             authorization_data=self.authorization.authorization_data,
             environment=self.authorization.environment,
+            transport=create_transport(self.authorization.developer_token, self.authorization.customer_id),
         )
+
+    def get_user(self):
+        """
+        Get the authenticated user.
+        """
         try:
-            get_user_response = customer_service.GetUser(UserId=None)
+            get_user_response = self.service_client.GetUser(UserId=None)
             user = get_user_response.User
             return user
         except WebFault as ex:
@@ -33,14 +52,8 @@ class CustomerManagementServiceClient:
         """
         Get accounts for the authenticated user.
         """
-        customer_service = ServiceClient(
-            service="CustomerManagementService",
-            version=13,
-            authorization_data=self.authorization.authorization_data,
-            environment=self.authorization.environment,
-        )
         try:
-            get_account_response = customer_service.GetAccountsInfo(
+            get_account_response = self.service_client.GetAccountsInfo(
                 CustomerId=self.authorization.customer_id)
             account_info = get_account_response.AccountInfo
             return account_info
@@ -49,21 +62,21 @@ class CustomerManagementServiceClient:
 
     def get_customers(self):
         """
-        Get customers for the authenticated user.
+        Get customers for the authenticated user, the customers are looked up concurrently.
         """
-        customer_service = ServiceClient(
-            service="CustomerManagementService",
-            version=13,
-            authorization_data=self.authorization.authorization_data,
-            environment=self.authorization.environment,
-        )
-        get_user_response = customer_service.GetUser(UserId=None)
-        response = []
-        for customer_role in get_user_response.CustomerRoles.CustomerRole:
+        get_user_response = self.service_client.GetUser(UserId=None)
+        customer_ids = list(dict.fromkeys(
+            customer_role.CustomerId for customer_role in get_user_response.CustomerRoles.CustomerRole))
+        # suds clients are not thread safe, every worker thread uses its own
+        thread_data = threading.local()
+
+        def get_customer(customer_id):
+            if not hasattr(thread_data, "service_client"):
+                thread_data.service_client = self._create_service_client()
             try:
-                get_customer_response = customer_service.GetCustomer(
-                    CustomerId=customer_role.CustomerId)
-                response.append(get_customer_response)
+                return thread_data.service_client.GetCustomer(CustomerId=customer_id)
             except WebFault as ex:
                 process_webfault_errors(ex)
-        return response
+
+        with ThreadPoolExecutor(max_workers=max(1, min(GET_CUSTOMER_PARALLELISM, len(customer_ids)))) as executor:
+            return list(executor.map(get_customer, customer_ids))
@@ -0,0 +1,116 @@
+import csv
+import logging
+import os
+import re
+from dataclasses import dataclass, field
+from operator import itemgetter
+from typing import Optional
+
+KEY_SPLIT_BY_ENTITY_TYPE = "split_by_entity_type"
+KEY_OUTPUT_COLUMNS = "output_columns"
+KEY_DROP_EMPTY_COLUMNS = "drop_empty_columns"
+
+TYPE_COLUMN = "Type"
+# rows describing the file itself, not entities
+SKIPPED_ENTITY_TYPES = {"Format Version"}
+
+
+@dataclass(slots=True)
+class EntityTypeTable:
+    """
+    Rows of a single entity type collected from bulk files of all accounts.
+    """
+    entity_type: str
+    table_file_name: str
+    # header-less files with all bulk columns, one per downloaded bulk file
+    file_paths: list[str] = field(default_factory=list)
+    # indexes of bulk columns which are not empty in any row of the entity type
+    non_empty_column_indexes: set[int] = field(default_factory=set)
+
+
+def get_entity_type_table_file_name(table_file_name: str, entity_type: str) -> str:
+    """
+    Returns file name of the output table of the entity type, e.g. Entities_AdGroup.csv for Ad Group.
+    """
+    return f"{table_file_name.removesuffix('.csv')}_{re.sub('[^A-Za-z0-9]+', '', entity_type)}.csv"
+
+
+def split_bulk_file_by_entity_type(file_path: str, columns: list[str], table_file_name: str, slice_file_name: str,
+                                   dst_directory: str, tables: dict[str, EntityTypeTable]):
+    """
+    Routes rows of the header-less bulk file into files of their entity types in a single pass
+    and records which columns are used by every entity type. Tables of the new entity types are added to tables.
+    """
+    type_index = columns.index(TYPE_COLUMN)
+    files = {}
+    try:
+        with open(file_path, 'r', encoding='utf-8', newline='') as src_f:
+            for row in csv.reader(src_f):
+                if not row or row[type_index] in SKIPPED_ENTITY_TYPES:
+                    continue
+                entity_type = row[type_index]
+                if entity_type not in files:
+                    if entity_type not in tables:
+                        tables[entity_type] = EntityTypeTable(
+                            entity_type=entity_type,
+                            table_file_name=get_entity_type_table_file_name(table_file_name, entity_type))
+                    table = tables[entity_type]
+                    table_directory = os.path.join(dst_directory, table.table_file_name)
+                    os.makedirs(table_directory, exist_ok=True)
+                    table.file_paths.append(os.path.join(table_directory, slice_file_name))
+                    dst_f = open(table.file_paths[-1], 'w', encoding='utf-8', newline='')
+                    files[entity_type] = (dst_f, csv.writer(dst_f), table,
+                                          [i for i in range(len(columns)) if i not in table.non_empty_column_indexes])
+                _, writer, table, empty_column_indexes = files[entity_type]
+                writer.writerow(row)
+                if empty_column_indexes:
+                    non_empty = [i for i in empty_column_indexes if row[i]]
+                    if non_empty:
+                        table.non_empty_column_indexes.update(non_empty)
+                        empty_column_indexes[:] = [i for i in empty_column_indexes if not row[i]]
+    finally:
+        for dst_f, _, _, _ in files.values():
+            dst_f.close()
+
+
+def find_non_empty_column_indexes(file_paths: list[str], column_count: int) -> set[int]:
+    """
+    Returns indexes of columns which are not empty in at least one row of the header-less CSV files.
+    Reading stops as soon as every column was found non-empty.
+    """
+    empty_column_indexes = list(range(column_count))
+    for file_path in file_paths:
+        with open(file_path, 'r', encoding='utf-8', newline='') as f:
+            for row in csv.reader(f):
+                if row:
+                    empty_column_indexes = [i for i in empty_column_indexes if not row[i]]
+                if not empty_column_indexes:
+                    return set(range(column_count))
+    return set(range(column_count)) - set(empty_column_indexes)
+
+
+def warn_about_unknown_columns(columns: list[str], allowed_columns: Optional[list[str]]):
+    unknown_columns = set(allowed_columns or []) - set(columns)
+    if unknown_columns:
+        logging.warning(f"Output columns {', '.join(sorted(unknown_columns))} are not in the downloaded data.")
+
+
+def select_column_indexes(columns: list[str], primary_key: list[str], allowed_columns: Optional[list[str]],
+                          non_empty_column_indexes: Optional[set[int]]) -> list[int]:
+    """
+    Returns indexes of the columns to output: the allowed columns (all if not specified) which are not empty
+    (if known), primary key columns are always included.
+    """
+    return [i for i, column in enumerate(columns)
+            if column in primary_key or ((not allowed_columns or column in allowed_columns)
+                                         and (non_empty_column_indexes is None or i in non_empty_column_indexes))]
+
+
+def project_csv_file(src_path: str, dst_path: str, column_indexes: list[int]):
+    """
+    Writes the header-less CSV file with only the given columns.
+    """
+    get_columns = itemgetter(*column_indexes) if len(column_indexes) > 1 else lambda row: (row[column_indexes[0]],)
+    with (open(src_path, 'r', encoding='utf-8', newline='') as src_f,
+          open(dst_path, 'w', encoding='utf-8', newline='') as dst_f):
+        csv.writer(dst_f).writerows(get_columns(row) for row in csv.reader(src_f) if row)
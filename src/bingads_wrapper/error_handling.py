@@ -1,7 +1,35 @@
 import logging
+import urllib.error
 
 from keboola.component import UserException
 
+# API errors which may succeed if the call is repeated: internal error and call rate exceeded
+TRANSIENT_ERROR_CODES = {"0", "117"}
+TRANSIENT_ERROR_NAMES = {"InternalError", "CallRateExceeded"}
+# calls which timed out in the API are repeated as well, they are recognized by the error name or message
+TIMEOUT_ERROR_MARKERS = ("timeout", "timed out")
+
+ERROR_ATTRIBUTE_SETS = (
+    ["ApiFault", "OperationErrors", "OperationError"],
+    ["AdApiFaultDetail", "Errors", "AdApiError"],
+    ["ApiFaultDetail", "BatchErrors", "BatchError"],
+    ["ApiFaultDetail", "OperationErrors", "OperationError"],
+    ["EditorialApiFaultDetail", "BatchErrors", "BatchError"],
+    ["EditorialApiFaultDetail", "EditorialErrors", "EditorialError"],
+    ["EditorialApiFaultDetail", "OperationErrors", "OperationError"],
+)
+
+
+class TransientApiError(UserException):
+    """
+    API error which may not occur again if the failed call is repeated, e.g. an internal error of the API.
+    """
+
+
+# errors after which the failed API call (a download step) is retried, not the whole download,
+# TimeoutError is raised by sockets (socket.timeout) of the default suds transport
+RETRIABLE_ERRORS = (ConnectionError, TimeoutError, urllib.error.URLError, TransientApiError)
+
 
 def output_error_message(message):
     logging.error(message)
@@ -20,38 +48,57 @@ def get_webfault_error_message(error):
     return ' | '.join(error_messages)
 
 
-def get_error_detail_string(error_detail, error_attribute_set) -> str:
+def get_api_errors(error_detail, error_attribute_set) -> list:
     api_errors = error_detail
     for _field in error_attribute_set:
         api_errors = getattr(api_errors, _field, None)
     if api_errors is None:
-        return ""
+        return []
+    return api_errors if isinstance(api_errors, list) else [api_errors]
+
 
-    if isinstance(api_errors, list):
-        error_string = '\n'.join([get_webfault_error_message(api_error) for api_error in api_errors])
-    else:
-        error_string = get_webfault_error_message(api_errors)
-    return error_string
+def get_error_detail_string(error_detail, error_attribute_set) -> str:
+    return '\n'.join([get_webfault_error_message(api_error)
+                      for api_error in get_api_errors(error_detail, error_attribute_set)])
+
+
+def is_timeout_message(message) -> bool:
+    return any(marker in str(message or "").lower() for marker in TIMEOUT_ERROR_MARKERS)
+
+
+def is_transient_api_error(api_error) -> bool:
+    return (str(getattr(api_error, "Code", None)) in TRANSIENT_ERROR_CODES
+            or getattr(api_error, "ErrorCode", None) in TRANSIENT_ERROR_NAMES
+            or is_timeout_message(getattr(api_error, "ErrorCode", None))
+            or is_timeout_message(getattr(api_error, "Message", None)))
+
+
+def is_transient_webfault(ex) -> bool:
+    """
+    Returns True if all API errors of the fault are transient. Faults without details (e.g. generic server
+    errors) and timeout faults are considered transient, faults with other errors are permanent
+    (e.g. invalid columns, auth).
+    """
+    if not hasattr(ex.fault, "detail"):
+        return True
+    for error_attribute_set in ERROR_ATTRIBUTE_SETS:
+        api_errors = get_api_errors(ex.fault.detail, error_attribute_set)
+        if api_errors:
+            return all(is_transient_api_error(api_error) for api_error in api_errors)
+    return is_timeout_message(getattr(ex.fault, "faultstring", None))
 
 
 def process_webfault_errors(ex):
+    """
+    Raises the fault as UserException, transient faults are raised as TransientApiError, so they can be retried.
+    """
+    exception_class = TransientApiError if is_transient_webfault(ex) else UserException
     if not hasattr(ex.fault, "detail"):
-        raise UserException(ex.fault.faultstring)
-
-    # WTF?
-    error_attribute_sets = (
-        ["ApiFault", "OperationErrors", "OperationError"],
-        ["AdApiFaultDetail", "Errors", "AdApiError"],
-        ["ApiFaultDetail", "BatchErrors", "BatchError"],
-        ["ApiFaultDetail", "OperationErrors", "OperationError"],
-        ["EditorialApiFaultDetail", "BatchErrors", "BatchError"],
-        ["EditorialApiFaultDetail", "EditorialErrors", "EditorialError"],
-        ["EditorialApiFaultDetail", "OperationErrors", "OperationError"],
-    )
+        raise exception_class(ex.fault.faultstring)
 
     errors = []
 
-    for error_attribute_set in error_attribute_sets:
+    for error_attribute_set in ERROR_ATTRIBUTE_SETS:
         error = get_error_detail_string(ex.fault.detail, error_attribute_set)
         if error:
             errors.append(error)
@@ -68,4 +115,4 @@ def process_webfault_errors(ex):
             errors.append(api_errors.Message)
 
     error_message = '\n'.join(errors)
-    raise UserException(error_message) from ex
+    raise exception_class(error_message) from ex
@@ -1,37 +1,105 @@
+import json
+import logging
+import os
 import pkgutil
 import xml.etree.ElementTree as ET
+from functools import cache
+from importlib.metadata import version
 
-reporting_xml_root_element = ET.fromstring(pkgutil.get_data("bingads.v13", "proxies/production/reporting_service.xml"))
-bulk_xml_root_element = ET.fromstring(pkgutil.get_data("bingads.v13", "proxies/production/bulk_service.xml"))
+# read from the package metadata, importing bingads just for its version is slow
+BINGADS_VERSION = version("bingads")
 
+XSD_NAMESPACE = "{http://www.w3.org/2001/XMLSchema}"
+# generated at image build time by scripts/create_metadata_index.py
+METADATA_INDEX_PATH = os.path.join(os.path.dirname(__file__), "metadata_index.json")
 
-def _generate_report_request_md_fragment(report_request_subtype_element: ET.Element) -> dict:
-    subtype_name: str = report_request_subtype_element.attrib["name"].replace("ReportRequest", "")
+KEY_BINGADS_VERSION = "bingads_version"
+KEY_REPORT_COLUMNS = "report_columns"
+KEY_BULK_ENTITIES = "bulk_entities"
+KEY_CAMPAIGN_TYPES = "campaign_types"
 
-    columns_type_element = reporting_xml_root_element.find(".//{http://www.w3.org/2001/XMLSchema}simpleType[@name='" +
-                                                           subtype_name + "ReportColumn']")
-    columns_enum_elements = columns_type_element.findall(".//{http://www.w3.org/2001/XMLSchema}enumeration")
-    column_names = [columns_enum_element.attrib["value"] for columns_enum_element in columns_enum_elements]
-    assert len(column_names) > 0
 
-    return {subtype_name: column_names}
-
-
-def get_report_available_columns() -> dict:
+def _parse_report_available_columns() -> dict:
+    reporting_xml_root_element = ET.fromstring(
+        pkgutil.get_data("bingads.v13", "proxies/production/reporting_service.xml"))
     report_request_subtype_defs = reporting_xml_root_element.findall(
-        ".//{http://www.w3.org/2001/XMLSchema}extension[@base='tns:ReportRequest']../..")
+        f".//{XSD_NAMESPACE}extension[@base='tns:ReportRequest']../..")
+    # index of column enumerations, so the schema is scanned once instead of once per report type
+    columns_type_elements = {}
+    for element in reporting_xml_root_element.iter(f"{XSD_NAMESPACE}simpleType"):
+        columns_type_elements.setdefault(element.get("name"), element)
 
     result_dict = {}
     for report_subtype_element in report_request_subtype_defs:
-        result_dict = {**result_dict, **_generate_report_request_md_fragment(report_subtype_element)}
+        subtype_name: str = report_subtype_element.attrib["name"].replace("ReportRequest", "")
+        columns_enum_elements = columns_type_elements[f"{subtype_name}ReportColumn"].findall(
+            f".//{XSD_NAMESPACE}enumeration")
+        column_names = [columns_enum_element.attrib["value"] for columns_enum_element in columns_enum_elements]
+        assert len(column_names) > 0
+        result_dict[subtype_name] = column_names
 
     return result_dict
 
 
-def get_available_bulk_entities() -> list:
+def _parse_available_bulk_entities() -> list:
+    bulk_xml_root_element = ET.fromstring(pkgutil.get_data("bingads.v13", "proxies/production/bulk_service.xml"))
     report_request_subtype_defs = bulk_xml_root_element.findall(
-        ".//{http://www.w3.org/2001/XMLSchema}simpleType/[@name='DownloadEntity']")
-    enums = report_request_subtype_defs[0].findall(".//{http://www.w3.org/2001/XMLSchema}enumeration")
+        f".//{XSD_NAMESPACE}simpleType/[@name='DownloadEntity']")
+    enums = report_request_subtype_defs[0].findall(f".//{XSD_NAMESPACE}enumeration")
     entity_names = [columns_enum_element.attrib["value"] for columns_enum_element in enums]
 
     return entity_names
+
+
+def _parse_campaign_types() -> list:
+    campaign_management_xml_root_element = ET.fromstring(
+        pkgutil.get_data("bingads.v13", "proxies/production/campaignmanagement_service.xml"))
+    campaign_type_def = campaign_management_xml_root_element.find(
+        f".//{XSD_NAMESPACE}simpleType/[@name='CampaignType']")
+    return [enum_element.attrib["value"] for enum_element in campaign_type_def.iter(f"{XSD_NAMESPACE}enumeration")]
+
+
+def create_metadata_index() -> dict:
+    """
+    Parses report columns, bulk entities and campaign types from the WSDLs of the installed bingads SDK.
+    """
+    return {
+        KEY_BINGADS_VERSION: BINGADS_VERSION,
+        KEY_REPORT_COLUMNS: _parse_report_available_columns(),
+        KEY_BULK_ENTITIES: _parse_available_bulk_entities(),
+        KEY_CAMPAIGN_TYPES: _parse_campaign_types(),
+    }
+
+
+def load_metadata_index(path: str = METADATA_INDEX_PATH) -> dict:
+    """
+    Loads the precomputed metadata index, the WSDLs are parsed instead if the index is missing
+    or was generated for a different bingads SDK version.
+    """
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            metadata_index = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        metadata_index = None
+    if (metadata_index and metadata_index.get(KEY_BINGADS_VERSION) == BINGADS_VERSION
+            and KEY_CAMPAIGN_TYPES in metadata_index):
+        return metadata_index
+    logging.debug(f"Metadata index for bingads {BINGADS_VERSION} not found, parsing the service WSDLs.")
+    return create_metadata_index()
+
+
+@cache
+def _get_metadata_index() -> dict:
+    return load_metadata_index()
+
+
+def get_report_available_columns() -> dict:
+    return _get_metadata_index()[KEY_REPORT_COLUMNS]
+
+
+def get_available_bulk_entities() -> list:
+    return _get_metadata_index()[KEY_BULK_ENTITIES]
+
+
+def get_campaign_types() -> list:
+    return _get_metadata_index()[KEY_CAMPAIGN_TYPES]
@@ -748,10 +748,11 @@ def get_prebuilt_report_config(preset_name: str, aggregation: Aggregation) -> di
     try:
         config = PREBUILT_CONFIGS[preset_name]
         columns_and_primary_key = config.columns_and_primary_key_by_aggregation[aggregation]
+        # returning copies, so that callers cannot modify the module level presets
         return {
             "report_type": config.report_type,
-            "columns": columns_and_primary_key.columns,
-            "primary_key": columns_and_primary_key.primary_key
+            "columns": list(columns_and_primary_key.columns),
+            "primary_key": list(columns_and_primary_key.primary_key)
         }
     except KeyError:
         raise UserException(f'Prebuilt report configuration for preset name "{preset_name}"'
@@ -0,0 +1,79 @@
+import threading
+import time
+from typing import Optional
+
+# limits of API calls, the rate of a limiter is lowered while the API throttles the calls
+CUSTOMER_CALLS_PER_SECOND = 10
+DEVELOPER_TOKEN_CALLS_PER_SECOND = 40
+MIN_CALLS_PER_SECOND = 0.5
+# the bucket allows bursts of calls made within this period at the full rate
+BURST_SECONDS = 2
+# fraction of the maximum rate recovered by every successful call
+RATE_RECOVERY_STEP = 0.05
+# delay of calls after a throttle fault, doubled for every further throttled attempt of the call
+THROTTLE_INITIAL_DELAY_SECONDS = 5
+THROTTLE_MAX_DELAY_SECONDS = 60
+THROTTLED_CALL_MAX_RETRIES = 5
+
+_rate_limiters: dict[tuple[str, str], "RateLimiter"] = {}
+_rate_limiters_lock = threading.Lock()
+
+
+class RateLimiter:
+    """
+    Thread safe token bucket limiting the rate of API calls. When the API throttles the calls, the rate is halved
+    and all calls are paused, then the rate recovers gradually with every successful call.
+    """
+
+    def __init__(self, calls_per_second: float):
+        self.max_rate = calls_per_second
+        self.rate = calls_per_second
+        self._tokens = calls_per_second * BURST_SECONDS
+        # time the tokens were last refilled at, in the future while the calls are paused
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Blocks until a call is allowed. Calls beyond the available tokens take tokens refilled in the future
+        and wait for them, so waiting calls are released one by one at the current rate.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if now > self._updated_at:
+                self._tokens = min(self.rate * BURST_SECONDS, self._tokens + (now - self._updated_at) * self.rate)
+                self._updated_at = now
+            self._tokens -= 1
+            wait_seconds = self._updated_at - now + max(0.0, -self._tokens) / self.rate
+        if wait_seconds > 0:
+            time.sleep(wait_seconds)
+
+    def on_success(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate * RATE_RECOVERY_STEP)
+
+    def on_throttled(self, delay_seconds: float):
+        with self._lock:
+            self.rate = max(MIN_CALLS_PER_SECOND, self.rate / 2)
+            self._tokens = 0
+            self._updated_at = max(self._updated_at, time.monotonic() + delay_seconds)
+
+
+def _get_rate_limiter(scope: str, key: str, calls_per_second: float) -> RateLimiter:
+    with _rate_limiters_lock:
+        if (scope, key) not in _rate_limiters:
+            _rate_limiters[(scope, key)] = RateLimiter(calls_per_second)
+        return _rate_limiters[(scope, key)]
+
+
+def get_rate_limiters(developer_token: Optional[str], customer_id: Optional[int]) -> list[RateLimiter]:
+    """
+    Returns the limiters every call of the developer token on behalf of the customer must pass,
+    the limiters are shared by all service clients of the process.
+    """
+    return [_get_rate_limiter("developer_token", str(developer_token), DEVELOPER_TOKEN_CALLS_PER_SECOND),
+            _get_rate_limiter("customer", str(customer_id), CUSTOMER_CALLS_PER_SECOND)]
+
+
+def get_throttle_delay(attempt: int) -> float:
+    return min(THROTTLE_INITIAL_DELAY_SECONDS * 2 ** attempt, THROTTLE_MAX_DELAY_SECONDS)
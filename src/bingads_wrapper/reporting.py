@@ -1,6 +1,6 @@
 import logging
 from dataclasses import dataclass, field
-from datetime import datetime
+from datetime import date, datetime, timedelta
 from typing import Optional
 
 from bingads.service_client import ServiceClient, AuthorizationData
@@ -28,6 +28,14 @@ KEY_TIME_ZONE = "time_zone"
 KEY_PERIOD = "period"
 KEY_DATE_RANGE_START = "date_from"
 KEY_DATE_RANGE_END = "date_to"
+KEY_DATE_WINDOW_DAYS = "date_window_days"
+KEY_DAY_WATERMARKS = "day_watermarks"
+KEY_LOOKBACK_DAYS = "lookback_days"
+
+CUSTOM_TIME_RANGE_PERIOD = "CustomTimeRange"
+DEFAULT_LOOKBACK_DAYS = 3
+# report time zones lag UTC by up to 12 hours, a day is complete only once it ended in all of them
+MAX_TIME_ZONE_UTC_LAG = timedelta(hours=12)
 
 MAX_COMPONENT_RUNTIME_SECONDS = 14400
 DOWNLOAD_REQUEST_TIMEOUT_PERIOD_MILLISECONDS = (MAX_COMPONENT_RUNTIME_SECONDS - 400) * 1000
@@ -37,12 +45,101 @@ EXCLUDE_COLUMNS_HEADERS = False
 EXCLUDE_REPORT_FOOTER = True
 EXCLUDE_REPORT_HEADER = True
 DEFAULT_FORMAT_VERSION = "2.0"
+MAX_ACCOUNT_IDS_PER_REPORT_REQUEST = 1000
 
 # this is only because ProductDimensionPerformance does not allow AccountId only AccountNumber
 # https://learn.microsoft.com/en-us/advertising/reporting-service/productdimensionperformancereportcolumn?view=bingads-13
 KEY_ACCOUNT_ID_COLUMNS = ["AccountId", "AccountNumber"]
 
 
+def parse_custom_date_range(time_dict: dict, last_sync_time_in_utc: Optional[datetime]) -> tuple[date, date]:
+    """
+    Parses Date From and Date To of the custom time range into absolute dates.
+    """
+    if time_dict[KEY_DATE_RANGE_START] == "last run":
+        if not last_sync_time_in_utc:
+            raise UserException(
+                'Date To specified as "last run", but no previous run sync time is available'
+                ' (probably because this is the first run of this configuration row).'
+                ' Please specify the Date To Time Range parameter as an absolute date (e.g. "2022-09-10"),'
+                ' or a relative date (e.g. "1 year ago").')
+        start_date = last_sync_time_in_utc
+    else:
+        start_date = parse(time_dict[KEY_DATE_RANGE_START])
+    end_date = parse(time_dict[KEY_DATE_RANGE_END])
+    if not start_date:
+        raise UserException("Date From could not be parsed.")
+    if not end_date:
+        raise UserException("Date To could not be parsed.")
+    logging.info(f"Custom dates parsed to these absolute values:\n"
+                 f" Date From: {start_date.isoformat(timespec='seconds')},"
+                 f" Date To: {end_date.isoformat(timespec='seconds')}")
+    return start_date.date(), end_date.date()
+
+
+def split_date_range(start_date: date, end_date: date, window_days: int) -> list[tuple[date, date]]:
+    """
+    Splits the inclusive date range into consecutive windows of at most window_days days.
+    """
+    assert window_days >= 1, "Date windows must span at least one day."
+    windows = []
+    window_start = start_date
+    while window_start <= end_date:
+        window_end = min(window_start + timedelta(days=window_days - 1), end_date)
+        windows.append((window_start, window_end))
+        window_start = window_end + timedelta(days=1)
+    return windows
+
+
+def get_report_date_windows(config_dict: dict, last_sync_time_in_utc: Optional[datetime],
+                            date_range: Optional[tuple[date, date]] = None) -> Optional[list[tuple[date, date]]]:
+    """
+    Returns date windows the custom time range of the report (or date_range if given) should be split into,
+    or None if the report should be requested as a whole.
+    """
+    time_dict: dict = config_dict.get(KEY_TIME_RANGE, {})
+    window_days = time_dict.get(KEY_DATE_WINDOW_DAYS)
+    if time_dict.get(KEY_PERIOD) != CUSTOM_TIME_RANGE_PERIOD or not window_days:
+        return None
+    if int(window_days) < 1:
+        raise UserException(f"Date window days must be at least 1, got {window_days}.")
+    start_date, end_date = date_range or parse_custom_date_range(time_dict, last_sync_time_in_utc)
+    windows = split_date_range(start_date, end_date, int(window_days))
+    logging.info(f"Custom time range will be downloaded in {len(windows)} window(s) of at most {window_days} days.")
+    return windows
+
+
+def get_account_date_ranges(config_dict: dict, accounts: list[str], watermarks: dict[str, str],
+                            last_sync_time_in_utc: Optional[datetime]) -> Optional[dict[str, tuple[date, date]]]:
+    """
+    Returns the custom time range of every account narrowed by its day watermark (the last downloaded day),
+    or None if day watermarks are not enabled. The range starts lookback days before the day following
+    the watermark, so late-arriving data (e.g. conversions) of the recent days are downloaded again,
+    but never before Date From. The range is empty (start after end) if the account is up to date.
+    """
+    time_dict: dict = config_dict.get(KEY_TIME_RANGE, {})
+    if time_dict.get(KEY_PERIOD) != CUSTOM_TIME_RANGE_PERIOD or not time_dict.get(KEY_DAY_WATERMARKS):
+        return None
+    lookback_days = time_dict.get(KEY_LOOKBACK_DAYS)
+    lookback_days = DEFAULT_LOOKBACK_DAYS if lookback_days is None else max(0, int(lookback_days))
+    start_date, end_date = parse_custom_date_range(time_dict, last_sync_time_in_utc)
+    date_ranges = {}
+    for account in accounts:
+        account_start_date = start_date
+        if watermark := watermarks.get(str(account)):
+            account_start_date = max(start_date, date.fromisoformat(watermark) + timedelta(days=1 - lookback_days))
+        date_ranges[account] = (account_start_date, end_date)
+    return date_ranges
+
+
+def get_last_complete_day(now_in_utc: datetime) -> date:
+    """
+    Returns the last day whose data can no longer change because it ended in any report time zone,
+    later days (e.g. today) must not be stored as a day watermark, so that they are downloaded again.
+    """
+    return (now_in_utc - MAX_TIME_ZONE_UTC_LAG).date() - timedelta(days=1)
+
+
 def get_account_column(report_type: str):
     """
     this is only because ProductDimensionPerformance does not allow AccountId only AccountNumber
@@ -64,7 +161,12 @@ class ReportingDownloadParametersFactory:
 
     result_file_name: Optional[str] = None
     last_sync_time_in_utc: Optional[datetime] = None
+    account_ids: Optional[list[int]] = None
+    # overrides the custom time range of the configuration (used when the range is split into windows)
+    date_range: Optional[tuple[date, date]] = None
+    exclude_column_headers: bool = EXCLUDE_COLUMNS_HEADERS
 
+    columns: Optional[list[str]] = field(init=False, default=None)
     primary_key: list[str] = field(init=False)
 
     _authorization_data: AuthorizationData = field(init=False)
@@ -130,7 +232,7 @@ class ReportingDownloadParametersFactory:
             self._set_report_request_scope_parameter()
 
     def _set_report_request_base_parameters(self):
-        self._report_request.ExcludeColumnHeaders = EXCLUDE_COLUMNS_HEADERS
+        self._report_request.ExcludeColumnHeaders = self.exclude_column_headers
         self._report_request.ExcludeReportFooter = EXCLUDE_REPORT_FOOTER
         self._report_request.ExcludeReportHeader = EXCLUDE_REPORT_HEADER
         self._report_request.Format.set(self.report_file_format)
@@ -149,25 +251,8 @@ class ReportingDownloadParametersFactory:
         period = time_dict[KEY_PERIOD]
 
         time.ReportTimeZone.set(time_zone)
-        if period == "CustomTimeRange":
-            if time_dict[KEY_DATE_RANGE_START] == "last run":
-                if not self.last_sync_time_in_utc:
-                    raise UserException(
-                        'Date To specified as "last run", but no previous run sync time is available'
-                        ' (probably because this is the first run of this configuration row).'
-                        ' Please specify the Date To Time Range parameter as an absolute date (e.g. "2022-09-10"),'
-                        ' or a relative date (e.g. "1 year ago").')
-                start_date = self.last_sync_time_in_utc
-            else:
-                start_date = parse(time_dict[KEY_DATE_RANGE_START])
-            end_date = parse(time_dict[KEY_DATE_RANGE_END])
-            if not start_date:
-                raise UserException("Date From could not be parsed.")
-            if not end_date:
-                raise UserException("Date To could not be parsed.")
-            logging.info(f"Custom dates parsed to these absolute values:\n"
-                         f" Date From: {start_date.isoformat(timespec='seconds')},"
-                         f" Date To: {end_date.isoformat(timespec='seconds')}")
+        if period == CUSTOM_TIME_RANGE_PERIOD:
+            start_date, end_date = self.date_range or parse_custom_date_range(time_dict, self.last_sync_time_in_utc)
             time.CustomDateRangeStart.Year = start_date.year
             time.CustomDateRangeStart.Month = start_date.month
             time.CustomDateRangeStart.Day = start_date.day
@@ -189,7 +274,8 @@ class ReportingDownloadParametersFactory:
         if isinstance(column_spec, str):
             column_names = comma_separated_str_to_list(column_spec)
         elif isinstance(column_spec, list):
-            column_names = column_spec
+            # copy, the list may be shared with other requests (preset or configuration lists)
+            column_names = list(column_spec)
 
         # column AccountId must be always present
         if not any(c in column_names for c in KEY_ACCOUNT_ID_COLUMNS):
@@ -198,13 +284,14 @@ class ReportingDownloadParametersFactory:
                 f"Column {account_id_col} not in columns configuration will be added!")
             column_names.append(account_id_col)
         column_array.extend(column_names)
+        self.columns = column_names
 
         primary_key_spec = self.config_dict.get(
             KEY_PRIMARY_KEY) or self.config_dict.get(KEY_PRIMARY_KEY_ARRAY, [])
         if isinstance(primary_key_spec, str):
             self.primary_key = comma_separated_str_to_list(primary_key_spec)
         elif isinstance(primary_key_spec, list):
-            self.primary_key = primary_key_spec
+            self.primary_key = list(primary_key_spec)
 
         # column AccountId must be always present
         if not any(c in self.primary_key for c in KEY_ACCOUNT_ID_COLUMNS):
@@ -221,5 +308,9 @@ class ReportingDownloadParametersFactory:
                 f" Primary key columns must be a subset of columns.")
 
     def _set_report_request_scope_parameter(self):
+        account_ids = self.account_ids or [self._authorization_data.account_id]
+        if len(account_ids) > MAX_ACCOUNT_IDS_PER_REPORT_REQUEST:
+            raise UserException(f"A single report request can contain at most {MAX_ACCOUNT_IDS_PER_REPORT_REQUEST}"
+                                f" accounts, {len(account_ids)} were requested.")
         self._report_request.Scope.AccountIds = {
-            "long": [self._authorization_data.account_id]}
+            "long": account_ids}
@@ -1,23 +1,57 @@
+import csv
+import logging
+import os
+import re
+import shutil
+import time
+import zipfile
 from abc import ABC, abstractmethod
+from concurrent.futures import Future, ThreadPoolExecutor
 from dataclasses import dataclass, field
-from datetime import datetime
-from typing import Optional
+from datetime import date, datetime
+from http import HTTPStatus
+from typing import Callable, Optional, TypeVar
 
-from bingads.v13.bulk import BulkServiceManager
+import requests
+from bingads.exceptions import FileDownloadException, TimeoutException
+from bingads.manifest import USER_AGENT
+from bingads.v13.bulk import BulkDownloadException, BulkDownloadOperation, BulkServiceManager
 from bingads.v13.bulk import DownloadParameters as BulkDownloadParameters
-from bingads.v13.reporting import ReportingServiceManager, ReportingDownloadParameters
+from bingads.v13.reporting import (ReportingServiceManager, ReportingDownloadParameters, ReportingDownloadOperation,
+                                   ReportingDownloadException)
 from suds import WebFault
 
 from .authorization import Authorization
 from .bulk import create_download_parameters as create_bulk_download_parameters
 from .bulk import create_primary_key as create_bulk_primary_key
-from .error_handling import process_webfault_errors
-from .reporting import ReportingDownloadParametersFactory
+from .bulk import get_shards as get_bulk_shards
+from .bulk import merge_bulk_files
+from .error_handling import RETRIABLE_ERRORS, process_webfault_errors
+from .reporting import ReportingDownloadParametersFactory, DOWNLOAD_REQUEST_TIMEOUT_PERIOD_MILLISECONDS
+from .streaming import iter_zip_member_content, split_first_line
+from .transport import create_transport, get_http_session
+from .utils import COPY_BUFFER_SIZE
 
 import backoff
-import urllib.error
 
 REPORT_FILE_FORMAT = "Csv"
+REPORT_STATUS_PENDING = "Pending"
+REPORT_STATUS_SUCCESS = "Success"
+# status of every report is polled with its own interval, growing from the initial to the maximum one,
+# so small reports are picked up quickly and long-running reports do not waste API calls
+REPORT_POLL_INITIAL_INTERVAL_SECONDS = 1
+REPORT_POLL_MAX_INTERVAL_SECONDS = 30
+REPORT_POLL_INTERVAL_GROWTH_FACTOR = 1.5
+STREAM_CHUNK_SIZE = 1024 * 1024
+# connect and read (between two received chunks) timeout of streamed downloads
+STREAM_DOWNLOAD_TIMEOUT_SECONDS = (30, 300)
+
+CONTENT_RANGE_PATTERN = re.compile(r"bytes (\d+)-")
+
+# a corrupted (e.g. wrongly resumed) archive is downloaded again from the start
+DOWNLOAD_RETRIABLE_ERRORS = RETRIABLE_ERRORS + (requests.RequestException, FileDownloadException, zipfile.BadZipFile)
+
+T = TypeVar('T')
 
 
 @dataclass(slots=True)
@@ -30,6 +64,11 @@ class DownloadRequest(ABC):
 
     primary_key: list[str] = field(init=False)
     result_file_name: str = field(init=False)
+    # columns of the result file, must be known upfront if the result file is downloaded without a header
+    columns: Optional[list[str]] = field(init=False, default=None)
+    has_header: bool = field(init=False, default=True)
+    # the result file contains only changes since last_sync_time_in_utc
+    is_delta: bool = field(init=False, default=False)
 
     _download_parameters: BulkDownloadParameters | ReportingDownloadParameters = field(init=False)
     _service_manager: BulkServiceManager | ReportingServiceManager = field(init=False)
@@ -38,15 +77,16 @@ class DownloadRequest(ABC):
     def __post_init__(self):
         pass  # Initialization of uninitialized/optional fields must be done in derived classes
 
-    @backoff.on_exception(backoff.expo, (ConnectionError, urllib.error.URLError), max_tries=5)
+    @abstractmethod
     def process(self):
-        try:
-            self._service_manager.download_file(self._download_parameters)
-        except WebFault as ex:
-            process_webfault_errors(ex)
+        pass  # Downloads the result file, failed steps are retried separately
 
 
+@dataclass(slots=True)
 class BulkDownloadRequest(DownloadRequest):
+    # maximum number of concurrent bulk downloads if the download is split into shards
+    parallelism: int = 1
+
     def __post_init__(self):
         if not self.table_name:
             self.table_name = "Entities"
@@ -54,6 +94,7 @@ class BulkDownloadRequest(DownloadRequest):
         self._service_manager = BulkServiceManager(
             authorization_data=self.authorization.authorization_data,
             environment=self.authorization.environment,
+            transport=create_transport(self.authorization.developer_token, self.authorization.customer_id),
         )
         self._download_parameters = create_bulk_download_parameters(
             config_dict=self.config_dict,
@@ -63,9 +104,109 @@ class BulkDownloadRequest(DownloadRequest):
             report_file_format=REPORT_FILE_FORMAT,
         )
         self.primary_key = create_bulk_primary_key()
+        self.is_delta = self._download_parameters.last_sync_time_in_utc is not None
+
+    def process(self):
+        self.authorization.refresh_access_token_if_expiring()
+        shards = get_bulk_shards(self.config_dict, self.authorization, self.is_delta)
+        if not shards:
+            self._download_file(self._service_manager, self._download_parameters)
+            return
+        shard_download_parameters = [
+            create_bulk_download_parameters(
+                config_dict=self.config_dict,
+                last_sync_time_in_utc=self.last_sync_time_in_utc,
+                result_file_directory=self.result_file_directory,
+                result_file_name=f"shard_{i}_{self.result_file_name}",
+                report_file_format=REPORT_FILE_FORMAT,
+                download_entities=download_entities,
+                campaign_ids=campaign_ids)
+            for i, (download_entities, campaign_ids) in enumerate(shards)]
+        with ThreadPoolExecutor(max_workers=max(1, min(self.parallelism, len(shards)))) as executor:
+            futures = [executor.submit(self._download_shard, download_parameters)
+                       for download_parameters in shard_download_parameters]
+            try:
+                for future in futures:
+                    future.result()
+            except BaseException:
+                executor.shutdown(wait=True, cancel_futures=True)
+                raise
+        shard_paths = [os.path.join(self.result_file_directory, download_parameters.result_file_name)
+                       for download_parameters in shard_download_parameters]
+        merge_bulk_files(shard_paths, os.path.join(self.result_file_directory, self.result_file_name))
+        for shard_path in shard_paths:
+            if os.path.exists(shard_path):
+                os.remove(shard_path)
+
+    def _download_shard(self, download_parameters: BulkDownloadParameters):
+        # service clients are not thread safe, every shard uses its own
+        service_manager = BulkServiceManager(
+            authorization_data=self.authorization.authorization_data,
+            environment=self.authorization.environment,
+            transport=create_transport(self.authorization.developer_token, self.authorization.customer_id),
+        )
+        self._download_file(service_manager, download_parameters)
+
+    def _download_file(self, service_manager: BulkServiceManager, download_parameters: BulkDownloadParameters):
+        """
+        Submits, tracks and downloads the bulk file in separate steps (as the SDK's download_file does),
+        so a failed step is retried without repeating the previous ones.
+        """
+        operation = self._submit(service_manager, download_parameters)
+        self._track(operation, download_parameters)
+        self._download_result_file(operation, download_parameters)
+
+    @backoff.on_exception(backoff.expo, RETRIABLE_ERRORS, max_tries=5)
+    def _submit(self, service_manager: BulkServiceManager,
+                download_parameters: BulkDownloadParameters) -> BulkDownloadOperation:
+        self.authorization.refresh_access_token_if_expiring()
+        try:
+            return service_manager.submit_download(download_parameters._submit_download_parameter)
+        except WebFault as ex:
+            process_webfault_errors(ex)
+
+    @backoff.on_exception(backoff.expo, RETRIABLE_ERRORS, max_tries=5)
+    def _track(self, operation: BulkDownloadOperation, download_parameters: BulkDownloadParameters):
+        self.authorization.refresh_access_token_if_expiring()
+        try:
+            operation.track(timeout_in_milliseconds=download_parameters.timeout_in_milliseconds)
+        except WebFault as ex:
+            process_webfault_errors(ex)
+        except TimeoutException:
+            raise BulkDownloadException("Bulk file download tracking status timeout.")
 
+    @backoff.on_exception(backoff.expo, DOWNLOAD_RETRIABLE_ERRORS, max_tries=5)
+    def _download_result_file(self, operation: BulkDownloadOperation, download_parameters: BulkDownloadParameters):
+        operation.download_result_file(
+            result_file_directory=download_parameters.result_file_directory,
+            result_file_name=download_parameters.result_file_name,
+            decompress=download_parameters.decompress_result_file,
+            overwrite=download_parameters.overwrite_result_file,
+            timeout_in_milliseconds=download_parameters.timeout_in_milliseconds,
+        )
 
+
+@dataclass(slots=True)
 class ReportDownloadRequest(DownloadRequest):
+    # accounts to include in the report, only the account of authorization data is used if not specified
+    account_ids: Optional[list[int]] = None
+    # overrides the custom time range of the configuration
+    date_range: Optional[tuple[date, date]] = None
+    exclude_column_headers: bool = False
+    # download the report archive and decompress it in a single pass without storing the archive
+    stream_download: bool = False
+
+    _operation: Optional[ReportingDownloadOperation] = field(init=False, default=None)
+    # monotonic time of the next status poll
+    next_poll_at: float = field(init=False, default=0.0)
+    _poll_interval: float = field(init=False, default=REPORT_POLL_INITIAL_INTERVAL_SECONDS)
+    _poll_count: int = field(init=False, default=0)
+    _submitted_at: Optional[float] = field(init=False, default=None)
+    _ready_at: Optional[float] = field(init=False, default=None)
+    # URL of the generated report, it is valid only for a limited time
+    _download_url: Optional[str] = field(init=False, default=None)
+    _download_url_expired: bool = field(init=False, default=False)
+
     def __post_init__(self):
         if self.table_name:
             self.result_file_name = f"{self.table_name}.csv"
@@ -74,6 +215,7 @@ class ReportDownloadRequest(DownloadRequest):
         self._service_manager = ReportingServiceManager(
             authorization_data=self.authorization.authorization_data,
             environment=self.authorization.environment,
+            transport=create_transport(self.authorization.developer_token, self.authorization.customer_id),
         )
         reporting_download_parameters_factory = ReportingDownloadParametersFactory(
             config_dict=self.config_dict,
@@ -81,9 +223,212 @@ class ReportDownloadRequest(DownloadRequest):
             result_file_name=self.result_file_name,
             report_file_format=REPORT_FILE_FORMAT,
             reporting_service=self._service_manager._service_client,
-            last_sync_time_in_utc=self.last_sync_time_in_utc)
+            last_sync_time_in_utc=self.last_sync_time_in_utc,
+            account_ids=self.account_ids,
+            date_range=self.date_range,
+            exclude_column_headers=self.exclude_column_headers)
         self._download_parameters = reporting_download_parameters_factory.create()
         if not self.table_name:
             self.result_file_name = reporting_download_parameters_factory.result_file_name
             self.table_name = self.result_file_name.removesuffix(".csv")
         self.primary_key = reporting_download_parameters_factory.primary_key
+        self.columns = reporting_download_parameters_factory.columns
+        self.has_header = not self.exclude_column_headers
+
+    def process(self):
+        self.submit()
+        deadline = time.monotonic() + DOWNLOAD_REQUEST_TIMEOUT_PERIOD_MILLISECONDS / 1000
+        while True:
+            time.sleep(max(0.0, self.next_poll_at - time.monotonic()))
+            if self.poll():
+                break
+            if time.monotonic() > deadline:
+                raise ReportingDownloadException("Reporting file download tracking status timeout.")
+        self.download()
+
+    @backoff.on_exception(backoff.expo, RETRIABLE_ERRORS, max_tries=5)
+    def submit(self):
+        """
+        Submits the report request without waiting for the report to be generated.
+        """
+        self.authorization.refresh_access_token_if_expiring()
+        try:
+            self._operation = self._service_manager.submit_download(self._download_parameters.report_request)
+        except WebFault as ex:
+            process_webfault_errors(ex)
+        self._submitted_at = time.monotonic()
+        self._poll_interval = REPORT_POLL_INITIAL_INTERVAL_SECONDS
+        self.next_poll_at = self._submitted_at + self._poll_interval
+
+    @backoff.on_exception(backoff.expo, RETRIABLE_ERRORS, max_tries=5)
+    def poll(self) -> bool:
+        """
+        Checks the status of the submitted report, returns True once the report is ready to be downloaded.
+        """
+        self.authorization.refresh_access_token_if_expiring()
+        status = self._poll_generate_report()
+        self._poll_count += 1
+        if status.Status == REPORT_STATUS_PENDING:
+            self._poll_interval = min(self._poll_interval * REPORT_POLL_INTERVAL_GROWTH_FACTOR,
+                                      REPORT_POLL_MAX_INTERVAL_SECONDS)
+            self.next_poll_at = time.monotonic() + self._poll_interval
+            return False
+        if status.Status != REPORT_STATUS_SUCCESS:
+            raise ReportingDownloadException(f"Report generation failed with status {status.Status}.")
+        self._ready_at = time.monotonic()
+        self._download_url = status.ReportDownloadUrl
+        return True
+
+    def _poll_generate_report(self):
+        """
+        Returns the status of the report request. The service is called directly, the get_status method
+        of the SDK repeats every failed call on its own (even permanent faults), multiplying the retries.
+        """
+        try:
+            return self._operation.service_client.PollGenerateReport(self._operation.request_id)
+        except WebFault as ex:
+            process_webfault_errors(ex)
+
+    @backoff.on_exception(backoff.expo, DOWNLOAD_RETRIABLE_ERRORS, max_tries=5)
+    def download(self):
+        """
+        Downloads the generated report, the report must be ready (see poll).
+        """
+        download_started_at = time.monotonic()
+        if self._download_url_expired:
+            self._refresh_download_url()
+        # no URL is returned if no data are available for the report
+        if self._download_url and self.stream_download:
+            self._download_streamed()
+        elif self._download_url:
+            self._download_archived()
+        accounts = self.account_ids or [self.authorization.account_id]
+        logging.info(f"Report {self.result_file_name} of account(s) {', '.join(str(a) for a in accounts)} was"
+                     f" ready {self._ready_at - self._submitted_at:.1f} s after submission ({self._poll_count}"
+                     f" status poll(s)) and downloaded in {time.monotonic() - download_started_at:.1f} s.")
+
+    def _refresh_download_url(self):
+        """
+        Requests a new download URL of the already generated report, the report is not generated again.
+        """
+        self.authorization.refresh_access_token_if_expiring()
+        self._download_url = self._poll_generate_report().ReportDownloadUrl
+        self._download_url_expired = False
+
+    def _request_download(self, headers: Optional[dict] = None) -> requests.Response:
+        response = get_http_session().get(self._download_url, headers={"User-Agent": USER_AGENT, **(headers or {})},
+                                          stream=True, timeout=STREAM_DOWNLOAD_TIMEOUT_SECONDS)
+        if response.status_code == HTTPStatus.FORBIDDEN:
+            # the URL expired, a new one is requested before the download is retried
+            self._download_url_expired = True
+        if response.status_code != HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE:
+            try:
+                response.raise_for_status()
+            except requests.HTTPError:
+                response.close()
+                raise
+        return response
+
+    def _download_archived(self):
+        """
+        Downloads the report archive and decompresses it into the result file. If the download fails,
+        the partially downloaded archive is kept and the next attempt resumes it from the last received byte.
+        """
+        archive_path = os.path.join(self.result_file_directory, f"{os.path.splitext(self.result_file_name)[0]}.zip")
+        result_file_path = os.path.join(self.result_file_directory, self.result_file_name)
+        offset = os.path.getsize(archive_path) if os.path.exists(archive_path) else 0
+        response = self._request_download({"Range": f"bytes={offset}-"} if offset else None)
+        if offset and response.status_code == HTTPStatus.PARTIAL_CONTENT and _get_range_start(response) != offset:
+            # the server sent another part of the archive than requested, the whole archive is downloaded again
+            response.close()
+            offset = 0
+            response = self._request_download()
+        with response:
+            # the range is not satisfiable if the archive was completely received by the previous attempt
+            if response.status_code != HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE:
+                if response.status_code != HTTPStatus.PARTIAL_CONTENT:
+                    # the server sent the whole archive
+                    offset = 0
+                with open(archive_path, "ab" if offset else "wb") as archive_file:
+                    for chunk in response.iter_content(chunk_size=STREAM_CHUNK_SIZE):
+                        archive_file.write(chunk)
+        if not self._download_parameters.decompress_result_file:
+            os.replace(archive_path, result_file_path)
+            return
+        try:
+            with (zipfile.ZipFile(archive_path) as archive,
+                  archive.open(archive.namelist()[0]) as member_file,
+                  open(result_file_path, "wb") as result_file):
+                shutil.copyfileobj(member_file, result_file, COPY_BUFFER_SIZE)
+        except zipfile.BadZipFile:
+            os.remove(archive_path)
+            raise
+        os.remove(archive_path)
+
+    def _download_streamed(self):
+        """
+        Streams the report archive through the decompressor directly into the result file, removing the header
+        on the way, so the result file is written only once and the archive is never stored.
+        A failed download starts from the beginning, the state of the decompressor cannot be resumed.
+        """
+        result_file_path = os.path.join(self.result_file_directory, self.result_file_name)
+        with self._request_download() as response:
+            content = iter_zip_member_content(response.iter_content(chunk_size=STREAM_CHUNK_SIZE))
+            if self.has_header:
+                header_line, content = split_first_line(content)
+                if not header_line:
+                    return
+                self.columns = next(csv.reader([header_line.decode("utf-8-sig")]))
+            with open(result_file_path, "wb") as result_file:
+                for chunk in content:
+                    result_file.write(chunk)
+        self.has_header = False
+
+
+def _get_range_start(response: requests.Response) -> Optional[int]:
+    match = CONTENT_RANGE_PATTERN.match(response.headers.get("Content-Range", ""))
+    return int(match.group(1)) if match else None
+
+
+def process_report_download_requests(download_requests: list[ReportDownloadRequest],
+                                     post_process: Callable[[ReportDownloadRequest], T],
+                                     parallelism: int) -> list[T]:
+    """
+    Submits all report requests up front, then tracks all pending reports in a single polling loop
+    and downloads (and post-processes) each report as soon as it is ready.
+
+    Returns results of post_process in the order of download_requests.
+    """
+    def download_and_post_process(download_request: ReportDownloadRequest) -> T:
+        download_request.download()
+        return post_process(download_request)
+
+    with ThreadPoolExecutor(max_workers=parallelism) as executor:
+        try:
+            for submit_future in [executor.submit(r.submit) for r in download_requests]:
+                submit_future.result()
+            logging.info(f"Submitted {len(download_requests)} report request(s), waiting for the reports to be ready.")
+
+            deadline = time.monotonic() + DOWNLOAD_REQUEST_TIMEOUT_PERIOD_MILLISECONDS / 1000
+            download_futures: dict[int, Future] = {}
+            pending = list(enumerate(download_requests))
+            while pending:
+                if time.monotonic() > deadline:
+                    raise ReportingDownloadException("Reporting file download tracking status timeout.")
+                # wait for the report due first, only the reports which are due are polled
+                time.sleep(max(0.0, min(r.next_poll_at for _, r in pending) - time.monotonic()))
+                still_pending = []
+                for index, download_request in pending:
+                    if download_request.next_poll_at <= time.monotonic() and download_request.poll():
+                        download_futures[index] = executor.submit(download_and_post_process, download_request)
+                    else:
+                        still_pending.append((index, download_request))
+                pending = still_pending
+                # fail fast if some download already failed
+                for download_future in download_futures.values():
+                    if download_future.done() and download_future.exception():
+                        raise download_future.exception()
+            return [download_futures[index].result() for index in range(len(download_requests))]
+        except BaseException:
+            executor.shutdown(wait=True, cancel_futures=True)
+            raise
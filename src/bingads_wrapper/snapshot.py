@@ -0,0 +1,162 @@
+import csv
+import io
+import json
+import logging
+import sqlite3
+from enum import Enum, unique
+from typing import Optional
+
+KEY_SNAPSHOT_MODE = "snapshot_mode"
+
+TYPE_COLUMN = "Type"
+ID_COLUMN = "Id"
+PARENT_ID_COLUMN = "Parent Id"
+STATUS_COLUMN = "Status"
+DELETED_STATUS = "Deleted"
+
+SNAPSHOT_FILE_NAME = "bulk_snapshot.sqlite"
+SNAPSHOT_FILE_TAG = "bingads-bulk-snapshot"
+UPSERT_BATCH_SIZE = 10000
+# levels of the entity hierarchy, deletion of a campaign or an ad group also deletes entities below it
+ACCOUNT_LEVEL = 0
+CAMPAIGN_LEVEL = 1
+AD_GROUP_LEVEL = 2
+
+
+@unique
+class SnapshotMode(Enum):
+    DISABLED = "disabled"
+    CHANGED_ROWS = "changed_rows"
+    FULL_TABLE = "full_table"
+
+
+class BulkSnapshotStore:
+    """
+    Local snapshot of bulk entities of every account keyed by (Type, Id), stored in a SQLite database.
+    Delta bulk files are merged into it, so full tables can be reconstructed without full bulk downloads.
+    Rows are stored as serialized CSV lines, the columns are stored per account.
+    """
+
+    def __init__(self, path: str, fingerprint: str):
+        self.path = path
+        self._connection = sqlite3.connect(path)
+        self._connection.executescript("""
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+            CREATE TABLE IF NOT EXISTS accounts (account TEXT PRIMARY KEY, columns TEXT);
+            CREATE TABLE IF NOT EXISTS entities (
+                account TEXT, type TEXT, id TEXT, parent_id TEXT, row TEXT,
+                PRIMARY KEY (account, type, id));
+            CREATE INDEX IF NOT EXISTS entities_parent ON entities (account, parent_id);
+        """)
+        stored_fingerprint = self._connection.execute("SELECT value FROM meta WHERE key = 'fingerprint'").fetchone()
+        if stored_fingerprint and stored_fingerprint[0] != fingerprint:
+            logging.warning("Entity settings changed since the bulk snapshot was created, the snapshot is discarded"
+                            " and all data will be downloaded.")
+            self._connection.executescript("DELETE FROM accounts; DELETE FROM entities;")
+        self._connection.execute("INSERT OR REPLACE INTO meta VALUES ('fingerprint', ?)", (fingerprint,))
+        self._connection.commit()
+        # read up front, it is used from download threads
+        self.accounts: set[str] = {account for (account,) in self._connection.execute("SELECT account FROM accounts")}
+
+    def apply(self, account: str, columns: list[str], file_path: str, is_delta: bool):
+        """
+        Merges the header-less bulk file of the account into the snapshot. A full (not delta) file replaces
+        the snapshot of the account. Rows with the Deleted status are removed together with their children.
+        """
+        account = str(account)
+        stored_columns = self.get_columns(account)
+        if is_delta and stored_columns != columns:
+            logging.warning(f"Bulk snapshot of account {account} is missing or has different columns, it is"
+                            f" discarded and all data of the account will be downloaded in the next run.")
+            self._drop_account(account)
+            self._connection.commit()
+            return
+        if not is_delta:
+            self._drop_account(account)
+            self._connection.execute("INSERT INTO accounts VALUES (?, ?)", (account, json.dumps(columns)))
+
+        type_index, id_index = columns.index(TYPE_COLUMN), columns.index(ID_COLUMN)
+        parent_id_index = columns.index(PARENT_ID_COLUMN) if PARENT_ID_COLUMN in columns else None
+        status_index = columns.index(STATUS_COLUMN) if STATUS_COLUMN in columns else None
+        upserts = []
+        deleted_count = 0
+        with open(file_path, 'r', encoding='utf-8-sig', newline='') as file:
+            for row in csv.reader(file):
+                if not row:
+                    continue
+                if status_index is not None and row[status_index] == DELETED_STATUS:
+                    self._upsert(upserts)
+                    upserts = []
+                    deleted_count += self._delete(account, row[type_index], row[id_index])
+                    continue
+                upserts.append((account, row[type_index], row[id_index],
+                                row[parent_id_index] if parent_id_index is not None else None, _serialize(row)))
+                if len(upserts) >= UPSERT_BATCH_SIZE:
+                    self._upsert(upserts)
+                    upserts = []
+        self._upsert(upserts)
+        self._connection.commit()
+        self.accounts.add(account)
+        logging.info(f"Bulk {'delta' if is_delta else 'full'} file of account {account} applied to the snapshot,"
+                     f" {deleted_count} entities removed.")
+
+    def export(self, account: str, file_path: str):
+        """
+        Writes all entities of the account as a header-less CSV file.
+        """
+        with open(file_path, 'w', encoding='utf-8', newline='') as file:
+            for (row,) in self._connection.execute("SELECT row FROM entities WHERE account = ? ORDER BY rowid",
+                                                   (str(account),)):
+                file.write(row)
+
+    def get_columns(self, account: str) -> Optional[list[str]]:
+        stored = self._connection.execute("SELECT columns FROM accounts WHERE account = ?",
+                                          (str(account),)).fetchone()
+        return json.loads(stored[0]) if stored else None
+
+    def close(self):
+        self._connection.close()
+
+    def _drop_account(self, account: str):
+        self._connection.execute("DELETE FROM entities WHERE account = ?", (account,))
+        self._connection.execute("DELETE FROM accounts WHERE account = ?", (account,))
+        self.accounts.discard(account)
+
+    def _upsert(self, rows: list[tuple]):
+        if rows:
+            self._connection.executemany("INSERT OR REPLACE INTO entities VALUES (?, ?, ?, ?, ?)", rows)
+
+    def _delete(self, account: str, entity_type: str, entity_id: str) -> int:
+        # children (e.g. keywords of ad groups of a deleted campaign) are not listed in delta files,
+        # only lower levels of the hierarchy are followed, IDs of different entity types may collide
+        changes_before = self._connection.total_changes
+        self._connection.execute(f"""
+            WITH RECURSIVE deleted(type, id) AS (
+                SELECT ?, ?
+                UNION
+                SELECT entities.type, entities.id FROM entities JOIN deleted
+                    ON entities.account = ? AND entities.parent_id = deleted.id
+                    AND {_hierarchy_level("deleted.type")} IN ({CAMPAIGN_LEVEL}, {AD_GROUP_LEVEL})
+                    AND {_hierarchy_level("entities.type")} > {_hierarchy_level("deleted.type")}
+            )
+            DELETE FROM entities WHERE account = ? AND (type, id) IN (SELECT type, id FROM deleted)
+        """, (entity_type, entity_id, account, account))
+        return self._connection.total_changes - changes_before
+
+
+def _hierarchy_level(type_column: str) -> str:
+    return (f"CASE {type_column} WHEN 'Account' THEN {ACCOUNT_LEVEL} WHEN 'Campaign' THEN {CAMPAIGN_LEVEL}"
+            f" WHEN 'Ad Group' THEN {AD_GROUP_LEVEL} ELSE {AD_GROUP_LEVEL + 1} END")
+
+
+def _serialize(row: list[str]) -> str:
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator="\r\n").writerow(row)
+    return buffer.getvalue()
+
+
+def get_snapshot_fingerprint(config_dict: dict) -> str:
+    """
+    Identifies entity settings the snapshot was created with, the snapshot cannot be reused if they change.
+    """
+    return json.dumps({key: config_dict.get(key) for key in ("download_entities", "data_scope")}, sort_keys=True)
@@ -0,0 +1,118 @@
+import struct
+import zipfile
+import zlib
+from typing import Iterable, Iterator
+
+ZIP_LOCAL_FILE_HEADER_SIGNATURE = 0x04034b50
+ZIP_DATA_DESCRIPTOR_SIGNATURE = 0x08074b50
+ZIP_LOCAL_FILE_HEADER = struct.Struct("<IHHHHHIIIHH")
+ZIP_FLAG_DATA_DESCRIPTOR = 0x08
+ZIP_FLAG_ENCRYPTED = 0x01
+ZIP_METHOD_STORED = 0
+ZIP_METHOD_DEFLATED = 8
+ZIP_SIZE_UNKNOWN = 0xFFFFFFFF
+
+
+class _ByteStream:
+    """
+    Reads exact amounts of bytes from an iterable of chunks of arbitrary size.
+    """
+
+    def __init__(self, chunks: Iterable[bytes]):
+        self._chunks = iter(chunks)
+        self._buffer = b""
+
+    def read_exactly(self, size: int) -> bytes:
+        while len(self._buffer) < size:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                raise zipfile.BadZipFile("Unexpected end of the ZIP stream.")
+            self._buffer += chunk
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+    def read_available(self) -> Iterator[bytes]:
+        if self._buffer:
+            data, self._buffer = self._buffer, b""
+            yield data
+        for chunk in self._chunks:
+            if chunk:
+                yield chunk
+
+    def push_back(self, data: bytes):
+        self._buffer = data + self._buffer
+
+
+def iter_zip_member_content(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """
+    Decompresses the first member of a ZIP archive while it is being received,
+    without storing the archive anywhere. The rest of the archive (central directory) is ignored.
+    A truncated or corrupted archive raises BadZipFile (the download can be repeated),
+    an archive which cannot be decompressed at all raises ValueError.
+    """
+    stream = _ByteStream(chunks)
+    (signature, _, flags, method, _, _, crc, compressed_size, _, name_length,
+     extra_length) = ZIP_LOCAL_FILE_HEADER.unpack(stream.read_exactly(ZIP_LOCAL_FILE_HEADER.size))
+    if signature != ZIP_LOCAL_FILE_HEADER_SIGNATURE:
+        raise zipfile.BadZipFile("Downloaded file is not a ZIP archive.")
+    if flags & ZIP_FLAG_ENCRYPTED:
+        raise ValueError("Encrypted ZIP archives are not supported.")
+    stream.read_exactly(name_length + extra_length)
+
+    computed_crc = 0
+    if method == ZIP_METHOD_DEFLATED:
+        decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+        for chunk in stream.read_available():
+            data = decompressor.decompress(chunk)
+            if data:
+                computed_crc = zlib.crc32(data, computed_crc)
+                yield data
+            if decompressor.eof:
+                stream.push_back(decompressor.unused_data)
+                break
+        if not decompressor.eof:
+            raise zipfile.BadZipFile("Unexpected end of the ZIP stream.")
+    elif method == ZIP_METHOD_STORED and not flags & ZIP_FLAG_DATA_DESCRIPTOR and compressed_size != ZIP_SIZE_UNKNOWN:
+        remaining = compressed_size
+        for chunk in stream.read_available():
+            data = chunk[:remaining]
+            remaining -= len(data)
+            computed_crc = zlib.crc32(data, computed_crc)
+            yield data
+            if remaining == 0:
+                break
+        if remaining:
+            raise zipfile.BadZipFile("Unexpected end of the ZIP stream.")
+    else:
+        raise ValueError(f"Unsupported ZIP compression method {method}.")
+
+    if flags & ZIP_FLAG_DATA_DESCRIPTOR:
+        # CRC is stored in the data descriptor following the data, the descriptor signature is optional
+        (first_word,) = struct.unpack("<I", stream.read_exactly(4))
+        crc = first_word
+        if first_word == ZIP_DATA_DESCRIPTOR_SIGNATURE:
+            (crc,) = struct.unpack("<I", stream.read_exactly(4))
+    if computed_crc != crc:
+        raise zipfile.BadZipFile("CRC check of the downloaded ZIP archive failed.")
+
+
+def split_first_line(chunks: Iterable[bytes]) -> tuple[bytes, Iterator[bytes]]:
+    """
+    Splits the first line (including its line terminator) off a stream of chunks.
+    Returns the line and an iterator over the rest of the stream.
+    """
+    chunks = iter(chunks)
+    buffer = b""
+    for chunk in chunks:
+        buffer += chunk
+        line_end = buffer.find(b"\n")
+        if line_end != -1:
+            rest = buffer[line_end + 1:]
+            return buffer[:line_end + 1], _prepend(rest, chunks)
+    return buffer, iter(())
+
+
+def _prepend(data: bytes, chunks: Iterator[bytes]) -> Iterator[bytes]:
+    if data:
+        yield data
+    yield from chunks
@@ -0,0 +1,97 @@
+import http.client
+import io
+import logging
+import threading
+import urllib.error
+from typing import Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from suds.transport import Reply, TransportError
+from suds.transport.http import HttpTransport
+
+from .rate_limit import RateLimiter, THROTTLED_CALL_MAX_RETRIES, get_rate_limiters, get_throttle_delay
+
+# maximum number of kept-alive connections per host
+HTTP_POOL_SIZE = 32
+# code and name of the API error returned when calls of the developer token or customer are throttled
+CALL_RATE_EXCEEDED_MARKERS = (b"<Code>117</Code>", b"CallRateExceeded")
+# gateway errors and timeouts in front of the API, returned without a SOAP fault
+TRANSIENT_HTTP_STATUSES = {http.client.BAD_GATEWAY, http.client.SERVICE_UNAVAILABLE, http.client.GATEWAY_TIMEOUT}
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+
+def get_http_session() -> requests.Session:
+    """
+    Returns the HTTP session shared by all SOAP calls and downloads of the process,
+    so connections (and their TLS sessions) to the Bing Ads endpoints are kept alive and reused.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _session = session
+        return _session
+
+
+class SessionTransport(HttpTransport):
+    """
+    suds transport sending SOAP requests through the shared HTTP session instead of opening a new connection
+    for every call. Responses are requested gzip-encoded and decoded by requests.
+    Documents (the WSDLs bundled with the SDK) are still opened by the default transport.
+
+    Every call passes the rate limiters, calls throttled by the API are delayed and retried here,
+    so only the throttled call is repeated.
+    """
+
+    def __init__(self, session: requests.Session, rate_limiters: Optional[list[RateLimiter]] = None):
+        HttpTransport.__init__(self)
+        self._session = session
+        self._rate_limiters = rate_limiters or []
+
+    def send(self, request):
+        for attempt in range(THROTTLED_CALL_MAX_RETRIES + 1):
+            for rate_limiter in self._rate_limiters:
+                rate_limiter.acquire()
+            try:
+                response = self._session.post(request.url, data=request.message, headers=request.headers,
+                                              timeout=request.timeout or self.options.timeout)
+            except requests.RequestException as ex:
+                # the default transport raises urllib errors, download requests are retried on them
+                raise urllib.error.URLError(ex) from ex
+            if not (response.status_code >= 400 and is_call_rate_exceeded(response.content)):
+                for rate_limiter in self._rate_limiters:
+                    rate_limiter.on_success()
+                break
+            if attempt < THROTTLED_CALL_MAX_RETRIES:
+                delay_seconds = get_throttle_delay(attempt)
+                logging.warning(f"API call rate exceeded, the call will be retried in {delay_seconds} seconds.")
+                for rate_limiter in self._rate_limiters:
+                    rate_limiter.on_throttled(delay_seconds)
+        if response.status_code in (http.client.ACCEPTED, http.client.NO_CONTENT):
+            return None
+        if response.status_code in TRANSIENT_HTTP_STATUSES:
+            # suds would raise them as a generic exception, the failed call is retried on urllib errors
+            raise urllib.error.HTTPError(request.url, response.status_code, response.reason, response.headers,
+                                         io.BytesIO(response.content))
+        if response.status_code >= 400:
+            # SOAP faults are returned with HTTP errors, suds parses them from the response body
+            raise TransportError(response.reason, response.status_code, io.BytesIO(response.content))
+        return Reply(http.client.OK, response.headers, response.content)
+
+
+def is_call_rate_exceeded(content: bytes) -> bool:
+    return any(marker in content for marker in CALL_RATE_EXCEEDED_MARKERS)
+
+
+def create_transport(developer_token: Optional[str] = None, customer_id: Optional[int] = None) -> SessionTransport:
+    """
+    Returns transport for a new service client calling the API with the developer token on behalf
+    of the customer. Transports of all clients share the HTTP session and the rate limiters.
+    """
+    return SessionTransport(get_http_session(), get_rate_limiters(developer_token, customer_id))
@@ -1,2 +1,146 @@
+import errno
+import os
+import shutil
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+COPY_BUFFER_SIZE = 1024 * 1024
+# errors meaning that copy_file_range cannot be used for the files, falling back to copying through user space
+COPY_FILE_RANGE_UNSUPPORTED_ERRNOS = {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.EBADF}
+GZIP_BLOCK_SIZE = 8 * 1024 * 1024
+GZIP_COMPRESSION_LEVEL = 6
+# zlib window bits producing a gzip header and trailer
+GZIP_WBITS = 31
+
+
 def comma_separated_str_to_list(s: str, sep: str = ','):
     return [el.strip() for el in s.split(sep)]
+
+
+def copy_file_from_offset(src_path: str, dst_path: str, offset: int):
+    """
+    Copies the content of src_path starting at byte offset into dst_path with constant memory.
+    Uses in-kernel copy (copy_file_range) when available, buffered copy otherwise.
+    """
+    with open(src_path, 'rb', buffering=0) as src_f, open(dst_path, 'wb', buffering=0) as dst_f:
+        remaining = os.fstat(src_f.fileno()).st_size - offset
+        if hasattr(os, "copy_file_range"):
+            try:
+                while remaining > 0:
+                    copied = os.copy_file_range(src_f.fileno(), dst_f.fileno(), remaining, offset)
+                    if copied == 0:
+                        break
+                    offset += copied
+                    remaining -= copied
+            except OSError as ex:
+                if ex.errno not in COPY_FILE_RANGE_UNSUPPORTED_ERRNOS:
+                    raise
+        if remaining > 0:
+            src_f.seek(offset)
+            shutil.copyfileobj(src_f, dst_f, COPY_BUFFER_SIZE)
+
+
+def _gzip_compress_block(block: bytes) -> bytes:
+    return zlib.compress(block, GZIP_COMPRESSION_LEVEL, GZIP_WBITS)
+
+
+def gzip_compress_file_parallel(src_path: str, dst_path: str, workers: Optional[int] = None,
+                                block_size: int = GZIP_BLOCK_SIZE):
+    """
+    Gzip compresses src_path into dst_path using all cores (pigz-style).
+    The file is split into blocks which are compressed concurrently (zlib releases the GIL) into separate gzip
+    members written in the original order; concatenated gzip members form a valid gzip file.
+    At most 2 * workers blocks are held in memory at any time.
+    """
+    workers = workers or os.cpu_count() or 1
+    with (open(src_path, 'rb') as src_f, open(dst_path, 'wb') as dst_f,
+          ThreadPoolExecutor(max_workers=workers) as executor):
+        in_flight = deque()
+        while block := src_f.read(block_size):
+            in_flight.append(executor.submit(_gzip_compress_block, block))
+            if len(in_flight) >= 2 * workers:
+                dst_f.write(in_flight.popleft().result())
+        while in_flight:
+            dst_f.write(in_flight.popleft().result())
+        if dst_f.tell() == 0:
+            # an empty file still has to be a valid gzip file
+            dst_f.write(_gzip_compress_block(b""))
+
+
+def _find_csv_row_end(block: bytes, start: int, in_quotes: bool) -> tuple[int, bool]:
+    """
+    Finds the end of the first CSV row ending at or after start, newlines inside quoted values are skipped.
+    Returns the position after the row terminator (-1 if the row does not end in the block)
+    and whether the block end is inside a quoted value.
+    """
+    position = start
+    while True:
+        line_end = block.find(b"\n", position)
+        if line_end == -1:
+            return -1, in_quotes ^ bool(block.count(b'"', position) & 1)
+        in_quotes ^= bool(block.count(b'"', position, line_end) & 1)
+        if not in_quotes:
+            return line_end + 1, False
+        position = line_end + 1
+
+
+def split_csv_files_into_slices(src_paths: list[str], dst_directory: str, slice_file_name: str,
+                                slice_size: int) -> list[str]:
+    """
+    Concatenates header-less CSV files and splits the content into slices of roughly slice_size bytes,
+    cutting only at row boundaries. The files are streamed, a newline is considered a row boundary
+    only when it is not inside a quoted value (tracked by the parity of quote characters).
+    Returns paths of the created slices named <index>_<slice_file_name>.
+    """
+    slice_paths = []
+    slice_f = None
+    written = 0
+
+    def write(data: bytes):
+        nonlocal slice_f, written
+        if slice_f is None:
+            slice_paths.append(os.path.join(dst_directory, f"{len(slice_paths):05d}_{slice_file_name}"))
+            slice_f = open(slice_paths[-1], 'wb')
+            written = 0
+        slice_f.write(data)
+        written += len(data)
+
+    def close_slice():
+        nonlocal slice_f
+        slice_f.close()
+        slice_f = None
+
+    os.makedirs(dst_directory, exist_ok=True)
+    try:
+        for src_path in src_paths:
+            in_quotes = False
+            last_byte = b"\n"
+            with open(src_path, 'rb') as src_f:
+                while block := src_f.read(COPY_BUFFER_SIZE):
+                    last_byte = block[-1:]
+                    start = 0
+                    while start < len(block):
+                        remaining_size = slice_size - written if slice_f else slice_size
+                        if remaining_size > len(block) - start:
+                            in_quotes ^= bool(block.count(b'"', start) & 1)
+                            write(block[start:])
+                            break
+                        # slice is full once the row crossing the target size ends
+                        search_start = start + max(remaining_size, 0)
+                        in_quotes ^= bool(block.count(b'"', start, search_start) & 1)
+                        row_end, in_quotes = _find_csv_row_end(block, search_start, in_quotes)
+                        if row_end == -1:
+                            write(block[start:])
+                            break
+                        write(block[start:row_end])
+                        close_slice()
+                        start = row_end
+            if last_byte != b"\n" and slice_f:
+                # rows of the next file must not continue the last row of this one
+                write(b"\n")
+    finally:
+        if slice_f:
+            close_slice()
+    return slice_paths
@@ -2,18 +2,33 @@ import csv
 import json
 import logging
 import os
-from datetime import datetime, timezone
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import date, datetime, timezone
 from enum import Enum, unique
 from pathlib import Path
-from typing import Optional
+from typing import TYPE_CHECKING, Callable, Optional, TypeVar
 
 from keboola.component.base import ComponentBase, sync_action
+from keboola.component.dao import FileDefinition
 from keboola.component.exceptions import UserException
 
 from bingads_wrapper import metadata_provider
-from bingads_wrapper.authorization import Authorization
-from bingads_wrapper.customer_management import CustomerManagementServiceClient
-from bingads_wrapper.request import DownloadRequest, ReportDownloadRequest, BulkDownloadRequest
+from bingads_wrapper.entity_tables import (EntityTypeTable, KEY_DROP_EMPTY_COLUMNS, KEY_OUTPUT_COLUMNS,
+                                           KEY_SPLIT_BY_ENTITY_TYPE, find_non_empty_column_indexes, project_csv_file,
+                                           select_column_indexes, split_bulk_file_by_entity_type,
+                                           warn_about_unknown_columns)
+from bingads_wrapper.snapshot import (BulkSnapshotStore, SnapshotMode, get_snapshot_fingerprint, KEY_SNAPSHOT_MODE,
+                                      SNAPSHOT_FILE_NAME, SNAPSHOT_FILE_TAG)
+from bingads_wrapper.utils import copy_file_from_offset, gzip_compress_file_parallel, split_csv_files_into_slices
+
+# modules depending on the bingads SDK (and dateparser) are imported only by the actions using them,
+# importing the SDK takes most of the start-up time of the sync actions which do not need it
+if TYPE_CHECKING:
+    from bingads_wrapper.authorization import Authorization
+    from bingads_wrapper.request import DownloadRequest
 
 # Global configuration variables
 
@@ -27,6 +42,16 @@ KEY_DESTINATION = "destination"
 KEY_BULK_SETTINGS = "bulk_settings"
 KEY_REPORT_SETTINGS_CUSTOM = "report_settings_custom"
 KEY_REPORT_SETTINGS_PREBUILT = "report_settings_prebuilt"
+KEY_DOWNLOAD_SETTINGS = "download_settings"
+
+# Download settings variables
+KEY_PARALLELISM = "parallelism"
+KEY_REPORT_EXECUTION_MODE = "report_execution_mode"
+KEY_ACCOUNT_BATCH_SIZE = "account_batch_size"
+KEY_EXCLUDE_COLUMN_HEADERS = "exclude_column_headers"
+KEY_STREAM_DOWNLOAD = "stream_download"
+KEY_COMPRESS_OUTPUT = "compress_output"
+KEY_SLICE_SIZE_MB = "slice_size_mb"
 
 # Destination variables
 KEY_OUTPUT_TABLE_NAME = "output_table_name"
@@ -41,9 +66,17 @@ REQUIRED_IMAGE_PARAMETERS = ()
 KEY_REFRESH_TOKEN = "#refresh_token"
 KEY_NONCE = "#nonce"
 KEY_LAST_SYNC_TIME_IN_UTC = "last_sync_time_in_utc"
+KEY_REPORT_DAY_WATERMARKS = "report_day_watermarks"
+KEY_BULK_SYNC_TIMES_IN_UTC = "bulk_sync_times_in_utc"
 
 # Other constants
 NONCE_LENGTH = 32
+DEFAULT_PARALLELISM = 4
+DEFAULT_ACCOUNT_BATCH_SIZE = 1
+WORKING_DIRECTORY_NAME = "tmp"
+
+T = TypeVar('T')
+R = TypeVar('R')
 
 
 # Row config enums:
@@ -63,47 +96,81 @@ class LoadType(Enum):
     INCREMENTAL = "incremental_load"
 
 
+@unique
+class ReportExecutionMode(Enum):
+    """
+    report_execution_mode download settings parameter enum
+    """
+    PER_ACCOUNT = "per_account"
+    SUBMIT_ALL = "submit_all"
+
+
+@dataclass(slots=True)
+class DownloadTask:
+    """
+    Unit of work of a single download request.
+    """
+    # unique within the run, used as working directory name and prefix of the output slice
+    name: str
+    accounts: list[str]
+    date_range: Optional[tuple[date, date]] = None
+
+
 class ResultFile():
 
-    def __init__(self, download_request: DownloadRequest, account: str):
+    def __init__(self, download_request: 'DownloadRequest', slice_prefix: str):
         self.result_file_name = download_request.result_file_name
         self.result_file_directory = download_request.result_file_directory
-        self.result_file_full_path = os.path.join(
-            self.result_file_directory, self.result_file_name)
-        self.account = account
+        self.slice_prefix = slice_prefix
         self.primary_key = download_request.primary_key
-        self.columns, self.new_result_file_name, self.new_result_full_path = self._remove_header()
+        self.is_delta = download_request.is_delta
+        if download_request.has_header:
+            self.columns, self.new_result_file_name, self.new_result_full_path = self._remove_header()
+        else:
+            self.columns = download_request.columns
+            self.new_result_file_name, self.new_result_full_path = self._rename()
 
     def _remove_header(self):
         headers = []
         file = os.path.join(self.result_file_directory,
                             self.result_file_name)
 
-        new_file_name = f"{str(self.account)}_{self.result_file_name}"
+        new_file_name = f"{str(self.slice_prefix)}_{self.result_file_name}"
         new_file_full_path = os.path.join(
             self.result_file_directory, new_file_name)
-        # remove header from csv and return header for manifest
-        with open(file, 'r', encoding='utf-8-sig') as src_f:
-            with open(new_file_full_path, 'w', encoding='utf-8') as dst_f:
-                reader = csv.reader(src_f)
-                writer = csv.writer(dst_f)
-                headers = next(reader)
-
-                for row in reader:
-                    writer.writerow(row)
+        # remove header from csv and return header for manifest,
+        # only the header line is parsed, the rest of the file is copied byte by byte
+        with open(file, 'rb') as src_f:
+            header_line = src_f.readline()
+            data_offset = src_f.tell()
+        headers = next(csv.reader([header_line.decode('utf-8-sig')]))
+        copy_file_from_offset(file, new_file_full_path, data_offset)
         os.remove(file)
         return headers, new_file_name, new_file_full_path
 
-    def slice_result(self):
-        """
-        create slice folder as original output file
-        and move file to new folder as slice
-        """
-        os.makedirs(self.result_file_full_path, exist_ok=True)
-        slice_file_full_path = os.path.join(
-            self.result_file_full_path, self.new_result_file_name)
-        os.rename(self.new_result_full_path,
-                  slice_file_full_path)
+    def _rename(self):
+        file = os.path.join(self.result_file_directory,
+                            self.result_file_name)
+        new_file_name = f"{str(self.slice_prefix)}_{self.result_file_name}"
+        new_file_full_path = os.path.join(
+            self.result_file_directory, new_file_name)
+        # file downloaded without header, nothing to rewrite
+        os.rename(file, new_file_full_path)
+        return new_file_name, new_file_full_path
+
+
+def run_in_parallel(function: Callable[[T], R], items: list[T], parallelism: int) -> list[R]:
+    """
+    Calls function for every item using a bounded thread pool, returns results in the order of items.
+    Pending calls are cancelled as soon as any call fails.
+    """
+    with ThreadPoolExecutor(max_workers=parallelism) as executor:
+        futures = [executor.submit(function, item) for item in items]
+        try:
+            return [future.result() for future in futures]
+        except BaseException:
+            executor.shutdown(wait=True, cancel_futures=True)
+            raise
 
 
 def get_schema():
@@ -146,7 +213,18 @@ class BingAdsExtractor(ComponentBase):
 
         self.new_sync_time_in_utc_str = datetime.now(
             tz=timezone.utc).isoformat(timespec="seconds")
-        self.authorization: Authorization
+        # last downloaded report day of every account, kept until the extraction is done
+        self.report_day_watermarks: dict[str, str] = self.previous_state.get(KEY_REPORT_DAY_WATERMARKS, {})
+        # bulk sync time of every account, None if the state comes from a version with a single global sync time
+        self.bulk_sync_times_in_utc: Optional[dict[str, str]] = self.previous_state.get(KEY_BULK_SYNC_TIMES_IN_UTC)
+        self.bulk_snapshot: Optional[BulkSnapshotStore] = None
+        self._bulk_snapshot_file: Optional[FileDefinition] = None
+        self.authorization: 'Authorization'
+        # Refresh token callbacks may come from multiple download threads
+        self._state_lock = threading.Lock()
+        self.latest_refresh_token: Optional[str] = None
+        # downloads are done outside of the output folder, so that parallel downloads do not collide
+        self.working_directory = os.path.join(self.data_folder_path, WORKING_DIRECTORY_NAME)
         self.tenant_id = self.configuration.image_parameters.get("tenantId", "common")
 
         self.refresh_token_from_state: str = self.previous_state.get(
@@ -164,16 +242,18 @@ class BingAdsExtractor(ComponentBase):
         self.validate_configuration_parameters(REQUIRED_PARAMETERS)
         self._validate_configuration(from_sync_action)
 
-    def _init_authorization(self, account_id=None, customer_id=None):
+    def _init_authorization(self, account_id=None, customer_id=None) -> 'Authorization':
+        from bingads_wrapper.authorization import Authorization
+
         authorization_dict = self.configuration.parameters[KEY_AUTHORIZATION]
         authorization_dict['#developer_token'] = authorization_dict.get(
             '#developer_token') or self.configuration.image_parameters.get('developer_token')
         try:
-            self.authorization = Authorization(config_dict=authorization_dict,
-                                               oauth_credentials=self.get_oauth_credentials(),
-                                               save_refresh_token_function=self.save_state,
-                                               refresh_token_from_state=self.refresh_token_from_state,
-                                               account_id=account_id, customer_id=customer_id, tenant_id=self.tenant_id)
+            return Authorization(config_dict=authorization_dict,
+                                 oauth_credentials=self.get_oauth_credentials(),
+                                 save_refresh_token_function=self.save_state,
+                                 refresh_token_from_state=self.refresh_token_from_state,
+                                 account_id=account_id, customer_id=customer_id, tenant_id=self.tenant_id)
         except Exception as ex:
             raise UserException(
                 "Authorization failed, please try to reauthorize the configuration!") from ex
@@ -182,6 +262,9 @@ class BingAdsExtractor(ComponentBase):
         """
         Main execution code
         """
+        from bingads_wrapper.reporting import get_account_date_ranges
+        from bingads_wrapper.request import (BulkDownloadRequest, ReportDownloadRequest,
+                                             process_report_download_requests)
 
         self._init_configuration()
 
@@ -201,64 +284,384 @@ class BingAdsExtractor(ComponentBase):
             account_id, list) else [account_id]
         customer_id = self.configuration.parameters[KEY_AUTHORIZATION][KEY_CUSTOMER_ID]
 
-        results: list[ResultFile] = []
-        for account in accounts:
-            logging.info(
-                f"Downloading data for accountId: {account} and customerId: {customer_id}")
-            self._init_authorization(
-                account_id=account, customer_id=customer_id)
-            if object_type is ObjectType.ENTITY:
-                download_request_config_dict: dict = self.configuration.parameters[
-                    KEY_BULK_SETTINGS]
-                download_request_class = BulkDownloadRequest
-            elif object_type in (ObjectType.REPORT_CUSTOM, ObjectType.REPORT_PREBUILT):
-                download_request_config_dict: dict = (self.configuration.parameters[KEY_REPORT_SETTINGS_CUSTOM]
-                                                      if object_type is ObjectType.REPORT_CUSTOM else
-                                                      self.configuration.parameters[KEY_REPORT_SETTINGS_PREBUILT])
-                download_request_class = ReportDownloadRequest
-            else:
-                raise RuntimeError("Unexpected execution branch.")
-            download_request: DownloadRequest = download_request_class(
-                authorization=self.authorization,
-                config_dict=download_request_config_dict,
-                result_file_directory=self.tables_out_path,
-                table_name=table_name,
-                last_sync_time_in_utc=self.last_sync_time_in_utc,
-            )
-
+        if object_type is ObjectType.ENTITY:
+            download_request_config_dict: dict = self.configuration.parameters[
+                KEY_BULK_SETTINGS]
+            download_request_class = BulkDownloadRequest
+        elif object_type in (ObjectType.REPORT_CUSTOM, ObjectType.REPORT_PREBUILT):
+            download_request_config_dict: dict = (self.configuration.parameters[KEY_REPORT_SETTINGS_CUSTOM]
+                                                  if object_type is ObjectType.REPORT_CUSTOM else
+                                                  self.configuration.parameters[KEY_REPORT_SETTINGS_PREBUILT])
+            download_request_class = ReportDownloadRequest
+        else:
+            raise RuntimeError("Unexpected execution branch.")
+
+        download_settings: dict = self.configuration.parameters.get(KEY_DOWNLOAD_SETTINGS, {})
+        parallelism: int = max(1, int(download_settings.get(KEY_PARALLELISM, DEFAULT_PARALLELISM)))
+        logging.info(f"Downloading data for {len(accounts)} account(s) using {min(parallelism, len(accounts))}"
+                     f" parallel download(s).")
+
+        if download_request_class is ReportDownloadRequest:
+            download_request_options = {
+                "exclude_column_headers": bool(download_settings.get(KEY_EXCLUDE_COLUMN_HEADERS, False)),
+                "stream_download": bool(download_settings.get(KEY_STREAM_DOWNLOAD, False)),
+            }
+        else:
+            # shards of a bulk download share the parallelism setting
+            download_request_options = {"parallelism": parallelism}
+        account_batch_size: int = max(1, int(download_settings.get(KEY_ACCOUNT_BATCH_SIZE, DEFAULT_ACCOUNT_BATCH_SIZE)))
+        batch_accounts = download_request_class is ReportDownloadRequest and account_batch_size > 1
+        account_date_ranges = (get_account_date_ranges(download_request_config_dict, accounts,
+                                                       self.report_day_watermarks, self.last_sync_time_in_utc)
+                               if download_request_class is ReportDownloadRequest else None)
+        snapshot_mode = (SnapshotMode(download_request_config_dict.get(KEY_SNAPSHOT_MODE, SnapshotMode.DISABLED.value))
+                         if download_request_class is BulkDownloadRequest else SnapshotMode.DISABLED)
+        if snapshot_mode is not SnapshotMode.DISABLED:
+            self._open_bulk_snapshot(download_request_config_dict)
+
+        tasks = self._create_download_tasks(accounts, account_date_ranges, account_batch_size if batch_accounts else 1,
+                                            download_request_class, download_request_config_dict)
+
+        # one OAuth authentication shared by all accounts, per account authorizations are derived from it
+        self.authorization = self._init_authorization(customer_id=customer_id)
+
+        # download requests by task name, the bulk snapshot is exported through them for accounts without changes
+        download_requests: dict[str, 'DownloadRequest'] = {}
+
+        def create_download_request(task: DownloadTask) -> 'DownloadRequest':
+            download_request = self._create_download_request(
+                task=task, customer_id=customer_id, download_request_class=download_request_class,
+                download_request_config_dict=download_request_config_dict, table_name=table_name,
+                download_request_options=download_request_options)
+            download_requests[task.name] = download_request
+            return download_request
+
+        def download_task_data(task: DownloadTask) -> Optional[ResultFile]:
+            download_request = create_download_request(task)
             try:
                 download_request.process()
             except Exception as e:
                 raise UserException(f"Unable to download data: {e}") from e
+            return self._create_result_file(download_request, task)
 
-            file = os.path.join(
-                download_request.result_file_directory, download_request.result_file_name)
-            if os.path.exists(file):
-                results.append(ResultFile(
-                    download_request=download_request, account=account))
-            else:
-                logging.warning(f"Report for account:{account} is empty!")
+        execution_mode = ReportExecutionMode(
+            download_settings.get(KEY_REPORT_EXECUTION_MODE, ReportExecutionMode.PER_ACCOUNT.value))
+        if download_request_class is ReportDownloadRequest and execution_mode is ReportExecutionMode.SUBMIT_ALL:
+            submitted_requests = run_in_parallel(create_download_request, tasks, parallelism)
+            task_by_request = {id(r): task for r, task in zip(submitted_requests, tasks)}
+            try:
+                results = process_report_download_requests(
+                    download_requests=submitted_requests,
+                    post_process=lambda r: self._create_result_file(r, task_by_request[id(r)]),
+                    parallelism=parallelism)
+            except Exception as e:
+                raise UserException(f"Unable to download data: {e}") from e
+        else:
+            results = run_in_parallel(download_task_data, tasks, parallelism)
+        if self.bulk_snapshot:
+            results = self._apply_bulk_snapshot(tasks, results, snapshot_mode, download_requests)
+        results: list[ResultFile] = [result for result in results if result]
 
         # after all file created we can create sliced folder and move files to it
-        for result in results:
-            result.slice_result()
-
-        if results:
+        compress_output = bool(download_settings.get(KEY_COMPRESS_OUTPUT, False))
+        slice_size = int(download_settings.get(KEY_SLICE_SIZE_MB) or 0) * 1024 * 1024
+        if not results:
+            logging.warning("Extraction finished with no results.")
+        elif download_request_class is BulkDownloadRequest and download_request_config_dict.get(
+                KEY_SPLIT_BY_ENTITY_TYPE):
+            self._write_entity_type_tables(results, download_request_config_dict.get(KEY_OUTPUT_COLUMNS),
+                                           incremental, slice_size, compress_output)
+        else:
             last_result = results[-1]
+            files = [(result.new_result_full_path, result.new_result_file_name) for result in results]
+            columns = last_result.columns
+            if download_request_class is BulkDownloadRequest:
+                files, columns = self._project_bulk_files(files, columns, last_result.primary_key,
+                                                          download_request_config_dict)
+            self._write_output_table(last_result.result_file_name, files, columns, last_result.primary_key,
+                                     incremental, slice_size, compress_output)
+        shutil.rmtree(self.working_directory, ignore_errors=True)
+
+        # Extraction done, updating sync timestamp and watermarks in state
+        self.sync_time_in_utc_str = self.new_sync_time_in_utc_str
+        if account_date_ranges is not None:
+            self._update_report_day_watermarks(tasks)
+        if download_request_class is BulkDownloadRequest:
+            self._update_bulk_sync_times(tasks)
+        self.save_state(self.latest_refresh_token)  # type: ignore
 
-            table_def = self.create_out_table_definition(
-                last_result.result_file_name, incremental=incremental, columns=last_result.columns)
-            table_def.primary_key = last_result.primary_key
-
-            # Checking whether a CSV file was created
-            if os.path.exists(table_def.full_path):
-                self.write_manifest(table_def)
+    def _open_bulk_snapshot(self, download_request_config_dict: dict):
+        """
+        Opens the bulk snapshot of the previous run (input file mapped by its tag) or creates a new one.
+        The snapshot is stored as an output file of this run, so it is available to the next one.
+        """
+        row_tag = f"{SNAPSHOT_FILE_TAG}-{self.environment_variables.config_row_id or 'local'}"
+        os.makedirs(self.files_out_path, exist_ok=True)
+        self._bulk_snapshot_file = self.create_out_file_definition(SNAPSHOT_FILE_NAME,
+                                                                   tags=[SNAPSHOT_FILE_TAG, row_tag])
+        input_snapshots = self.get_input_files_definitions(tags=[row_tag])
+        if input_snapshots:
+            latest_snapshot = max(input_snapshots, key=lambda file: int(file.id or 0))
+            shutil.copyfile(latest_snapshot.full_path, self._bulk_snapshot_file.full_path)
+            logging.info(f"Using bulk snapshot from file {latest_snapshot.id}.")
         else:
-            logging.warning("Extraction finished with no results.")
+            logging.warning(f"No bulk snapshot found in input files (tag {row_tag}), all data will be downloaded.")
+        self.bulk_snapshot = BulkSnapshotStore(self._bulk_snapshot_file.full_path,
+                                               get_snapshot_fingerprint(download_request_config_dict))
 
-        # Extraction done, updating sync timestamp in state
-        self.sync_time_in_utc_str = self.new_sync_time_in_utc_str
-        self.save_state(self.authorization.refresh_token)  # type: ignore
+    def _apply_bulk_snapshot(self, tasks: list[DownloadTask], results: list[Optional[ResultFile]],
+                             snapshot_mode: SnapshotMode,
+                             download_requests: dict[str, 'DownloadRequest']) -> list[Optional[ResultFile]]:
+        """
+        Merges downloaded bulk files into the snapshot, in full table mode replaces them
+        by all entities of the account reconstructed from the snapshot. Accounts without downloaded changes
+        are exported from the snapshot as well, so the full table contains all accounts.
+        """
+        results = list(results)
+        for i, (task, result) in enumerate(zip(tasks, results)):
+            account = task.accounts[0]
+            if result:
+                self.bulk_snapshot.apply(account, result.columns, result.new_result_full_path, result.is_delta)
+                if snapshot_mode is not SnapshotMode.FULL_TABLE:
+                    continue
+                if str(account) in self.bulk_snapshot.accounts:
+                    self.bulk_snapshot.export(account, result.new_result_full_path)
+                else:
+                    logging.warning(f"Bulk snapshot of account {account} could not be applied, the output of this"
+                                    f" run contains only the changes downloaded for the account.")
+            elif snapshot_mode is SnapshotMode.FULL_TABLE and str(account) in self.bulk_snapshot.accounts:
+                logging.info(f"No changes downloaded for account {account}, its entities are taken from the snapshot.")
+                download_request = download_requests[task.name]
+                self.bulk_snapshot.export(account, os.path.join(download_request.result_file_directory,
+                                                                download_request.result_file_name))
+                download_request.columns = self.bulk_snapshot.get_columns(account)
+                download_request.has_header = False
+                results[i] = ResultFile(download_request=download_request, slice_prefix=task.name)
+        self.bulk_snapshot.close()
+        self.write_manifest(self._bulk_snapshot_file)
+        return results
+
+    def _write_output_table(self, table_file_name: str, files: list[tuple[str, str]], columns: list[str],
+                            primary_key: list[str], incremental: bool, slice_size: int, compress: bool):
+        """
+        Moves header-less files (path and slice name) into the sliced output table and writes its manifest.
+        With slice_size, the files are re-chunked into slices of roughly slice_size bytes, independently
+        of how the rows are distributed among the accounts. Slices are gzip compressed if requested.
+        """
+        output_directory = os.path.join(self.tables_out_path, table_file_name)
+        os.makedirs(output_directory, exist_ok=True)
+        if slice_size:
+            slice_directory = (os.path.join(self.working_directory, "slices", table_file_name) if compress
+                               else output_directory)
+            slice_paths = split_csv_files_into_slices([path for path, _ in files], slice_directory,
+                                                      table_file_name, slice_size)
+            for path, _ in files:
+                os.remove(path)
+            logging.info(f"Data of {len(files)} download(s) were split into {len(slice_paths)} output slice(s).")
+            files = [(slice_path, os.path.basename(slice_path)) for slice_path in slice_paths]
+        if compress:
+            logging.info(f"Compressing {len(files)} output slice(s).")
+        for path, slice_name in files:
+            if compress:
+                gzip_compress_file_parallel(path, os.path.join(output_directory, f"{slice_name}.gz"))
+                os.remove(path)
+            elif os.path.dirname(path) != output_directory:
+                os.rename(path, os.path.join(output_directory, slice_name))
+
+        table_def = self.create_out_table_definition(table_file_name, incremental=incremental, columns=columns)
+        table_def.primary_key = primary_key
+        self.write_manifest(table_def)
+
+    @staticmethod
+    def _project_bulk_files(files: list[tuple[str, str]], columns: list[str], primary_key: list[str],
+                            download_request_config_dict: dict) -> tuple[list[tuple[str, str]], list[str]]:
+        """
+        Keeps only the allowed columns of bulk files, without the columns empty in all rows if requested.
+        The first pass over the files finds the empty columns, the second one writes the projected files.
+        """
+        allowed_columns = download_request_config_dict.get(KEY_OUTPUT_COLUMNS)
+        drop_empty_columns = download_request_config_dict.get(KEY_DROP_EMPTY_COLUMNS, False)
+        if not allowed_columns and not drop_empty_columns:
+            return files, columns
+        warn_about_unknown_columns(columns, allowed_columns)
+        non_empty_column_indexes = (find_non_empty_column_indexes([path for path, _ in files], len(columns))
+                                    if drop_empty_columns else None)
+        column_indexes = select_column_indexes(columns, primary_key, allowed_columns, non_empty_column_indexes)
+        logging.info(f"Bulk data will be written with {len(column_indexes)} of {len(columns)} columns.")
+        if len(column_indexes) == len(columns):
+            return files, columns
+        projected_files = []
+        for path, slice_name in files:
+            project_csv_file(path, f"{path}.projected", column_indexes)
+            os.remove(path)
+            projected_files.append((f"{path}.projected", slice_name))
+        return projected_files, [columns[i] for i in column_indexes]
+
+    def _write_entity_type_tables(self, results: list[ResultFile], allowed_columns: Optional[list[str]],
+                                  incremental: bool, slice_size: int, compress: bool):
+        """
+        Splits bulk files into one output table per entity type, each with only the columns used by the type
+        (and allowed, if allowed columns are specified).
+        """
+        types_directory = os.path.join(self.working_directory, "entity_types")
+        tables: dict[str, EntityTypeTable] = {}
+        for result in results:
+            split_bulk_file_by_entity_type(result.new_result_full_path, result.columns, result.result_file_name,
+                                           result.new_result_file_name, types_directory, tables)
+            os.remove(result.new_result_full_path)
+        columns, primary_key = results[-1].columns, results[-1].primary_key
+        warn_about_unknown_columns(columns, allowed_columns)
+        for table in tables.values():
+            column_indexes = select_column_indexes(columns, primary_key, allowed_columns,
+                                                   table.non_empty_column_indexes)
+            projected_files = []
+            for file_path in table.file_paths:
+                projected_file_path = f"{file_path}.projected"
+                project_csv_file(file_path, projected_file_path, column_indexes)
+                os.remove(file_path)
+                projected_files.append((projected_file_path, os.path.basename(file_path)))
+            logging.info(f"Entity type {table.entity_type} written to table {table.table_file_name}"
+                         f" with {len(column_indexes)} of {len(columns)} columns.")
+            self._write_output_table(table.table_file_name, projected_files, [columns[i] for i in column_indexes],
+                                     primary_key, incremental, slice_size, compress)
+
+    def _create_download_tasks(self, accounts: list[str],
+                               account_date_ranges: Optional[dict[str, tuple[date, date]]], account_batch_size: int,
+                               download_request_class: type['DownloadRequest'],
+                               download_request_config_dict: dict) -> list[DownloadTask]:
+        """
+        Splits the download into tasks: accounts with the same date range are batched together (reports only)
+        and the date range is split into date windows if configured.
+        """
+        from bingads_wrapper.reporting import get_report_date_windows
+        from bingads_wrapper.request import ReportDownloadRequest
+
+        tasks = []
+        batch_count = 0
+        for date_range, group_accounts in self._group_accounts_by_date_range(accounts, account_date_ranges):
+            date_windows = (get_report_date_windows(download_request_config_dict, self.last_sync_time_in_utc,
+                                                    date_range)
+                            if download_request_class is ReportDownloadRequest else None)
+            account_batches = [group_accounts[i:i + account_batch_size]
+                               for i in range(0, len(group_accounts), account_batch_size)]
+            for account_batch in account_batches:
+                task_name = f"batch_{batch_count}" if account_batch_size > 1 else str(account_batch[0])
+                batch_count += 1
+                for task_date_range in date_windows or [date_range]:
+                    tasks.append(DownloadTask(
+                        name=(f"{task_name}_{task_date_range[0]:%Y%m%d}_{task_date_range[1]:%Y%m%d}"
+                              if task_date_range else task_name),
+                        accounts=account_batch, date_range=task_date_range))
+        if account_batch_size > 1:
+            logging.info(f"Accounts were grouped into {batch_count} batch(es)"
+                         f" of at most {account_batch_size} accounts.")
+        return tasks
+
+    @staticmethod
+    def _group_accounts_by_date_range(accounts: list[str],
+                                      account_date_ranges: Optional[dict[str, tuple[date, date]]]
+                                      ) -> list[tuple[Optional[tuple[date, date]], list[str]]]:
+        """
+        Groups accounts with the same date range, so they can be batched into the same report requests.
+        Accounts whose date range is empty are up to date and are left out.
+        """
+        if account_date_ranges is None:
+            return [(None, accounts)]
+        groups: dict[tuple[date, date], list[str]] = {}
+        for account in accounts:
+            start_date, end_date = account_date_ranges[account]
+            if start_date > end_date:
+                logging.info(f"Account {account} is up to date, skipping.")
+                continue
+            groups.setdefault((start_date, end_date), []).append(account)
+        for (start_date, end_date), group_accounts in groups.items():
+            logging.info(f"Downloading dates {start_date.isoformat()} - {end_date.isoformat()}"
+                         f" for {len(group_accounts)} account(s).")
+        return list(groups.items())
+
+    def _update_report_day_watermarks(self, tasks: list[DownloadTask]):
+        """
+        Moves the day watermark of every account to the last complete day downloaded by the run,
+        days which were still in progress are downloaded again by the next run regardless of the lookback.
+        """
+        from bingads_wrapper.reporting import get_last_complete_day
+
+        last_complete_day = get_last_complete_day(datetime.fromisoformat(self.new_sync_time_in_utc_str))
+        watermarks = dict(self.report_day_watermarks)
+        for task in tasks:
+            watermark = min(task.date_range[1], last_complete_day)
+            for account in task.accounts:
+                previous_watermark = watermarks.get(str(account))
+                if not previous_watermark or date.fromisoformat(previous_watermark) < watermark:
+                    watermarks[str(account)] = watermark.isoformat()
+        self.report_day_watermarks = watermarks
+
+    def _update_bulk_sync_times(self, tasks: list[DownloadTask]):
+        """
+        Sets the bulk sync time of every downloaded account to the time of this run. Sync times of a failed run
+        are not kept, the output tables of its completed accounts are not loaded either.
+        """
+        self.bulk_sync_times_in_utc = (self.bulk_sync_times_in_utc or {}) | {
+            str(account): self.new_sync_time_in_utc_str for task in tasks for account in task.accounts}
+
+    def _create_download_request(self, task: DownloadTask, customer_id: str,
+                                 download_request_class: type['DownloadRequest'],
+                                 download_request_config_dict: dict, table_name: str,
+                                 download_request_options: dict) -> 'DownloadRequest':
+        """
+        Creates download request of a single task downloading into its own working directory.
+        Runs in a worker thread, so it must not share any mutable state with downloads of other tasks.
+        """
+        from bingads_wrapper.request import BulkDownloadRequest
+
+        accounts_str = ", ".join(str(account) for account in task.accounts)
+        date_range_str = (f" and dates {task.date_range[0].isoformat()} - {task.date_range[1].isoformat()}"
+                          if task.date_range else "")
+        logging.info(
+            f"Downloading data for accountId: {accounts_str} and customerId: {customer_id}{date_range_str}")
+        authorization = self.authorization.for_account(task.accounts[0])
+        task_working_directory = os.path.join(self.working_directory, task.name)
+        os.makedirs(task_working_directory, exist_ok=True)
+        download_request_kwargs = {}
+        if len(task.accounts) > 1:
+            download_request_kwargs["account_ids"] = [int(account) for account in task.accounts]
+        if task.date_range:
+            download_request_kwargs["date_range"] = task.date_range
+        download_request_kwargs.update(download_request_options)
+        return download_request_class(
+            authorization=authorization,
+            config_dict=download_request_config_dict,
+            result_file_directory=task_working_directory,
+            table_name=table_name,
+            last_sync_time_in_utc=(self._get_bulk_last_sync_time_in_utc(task.accounts[0])
+                                   if download_request_class is BulkDownloadRequest else self.last_sync_time_in_utc),
+            **download_request_kwargs,
+        )
+
+    def _get_bulk_last_sync_time_in_utc(self, account: str) -> Optional[datetime]:
+        """
+        Returns the time of the last completed bulk download of the account,
+        accounts not downloaded yet (e.g. newly added ones) have none and are downloaded fully.
+        """
+        if self.bulk_snapshot and str(account) not in self.bulk_snapshot.accounts:
+            # delta of an account missing in the snapshot could not be merged
+            return None
+        if self.bulk_sync_times_in_utc is None:
+            # state of a previous version, the global sync time applied to all accounts
+            return self.last_sync_time_in_utc
+        sync_time_in_utc_str = self.bulk_sync_times_in_utc.get(str(account))
+        return datetime.fromisoformat(sync_time_in_utc_str) if sync_time_in_utc_str else None
+
+    def _create_result_file(self, download_request: 'DownloadRequest', task: DownloadTask) -> Optional[ResultFile]:
+        """
+        Removes the header from the downloaded file, returns None if nothing was downloaded.
+        """
+        file = os.path.join(
+            download_request.result_file_directory, download_request.result_file_name)
+        if os.path.exists(file):
+            return ResultFile(download_request=download_request, slice_prefix=task.name)
+        logging.warning(f"Report for account:{', '.join(str(account) for account in task.accounts)} is empty!")
+        return None
 
     def _validate_configuration(self, from_sync_action: bool = False):
         params: dict = self.configuration.parameters
@@ -301,13 +704,15 @@ class BingAdsExtractor(ComponentBase):
 
     @sync_action('get_accounts')
     def get_accounts(self):
+        from bingads_wrapper.customer_management import CustomerManagementServiceClient
+
         if not self.get_oauth_credentials():
             return []
         if not self.configuration.parameters.get(KEY_AUTHORIZATION, {}).get("customer_id"):
             raise UserException("Required parameter Customer ID is missing!")
         self._init_configuration(from_sync_action=True)
         customer_id = self.configuration.parameters[KEY_AUTHORIZATION][KEY_CUSTOMER_ID]
-        self._init_authorization(customer_id=customer_id)
+        self.authorization = self._init_authorization(customer_id=customer_id)
         customer_client = CustomerManagementServiceClient(
             authorization=self.authorization)
         account_info: dict() = customer_client.get_accounts()  # type: ignore
@@ -321,10 +726,12 @@ class BingAdsExtractor(ComponentBase):
 
     @sync_action('get_customers')
     def get_customers(self):
+        from bingads_wrapper.customer_management import CustomerManagementServiceClient
+
         if not self.get_oauth_credentials():
             return []
         self._init_configuration(from_sync_action=True)
-        self._init_authorization()
+        self.authorization = self._init_authorization()
         customer_client = CustomerManagementServiceClient(
             authorization=self.authorization)
         customers: dict() = customer_client.get_customers()  # type: ignore
@@ -339,10 +746,14 @@ class BingAdsExtractor(ComponentBase):
         """
         Save refresh token to state file.
         """
-        self.write_state_file({
-            KEY_REFRESH_TOKEN: refresh_token,
-            KEY_LAST_SYNC_TIME_IN_UTC: self.sync_time_in_utc_str,
-        })
+        with self._state_lock:
+            self.latest_refresh_token = refresh_token
+            self.write_state_file({
+                KEY_REFRESH_TOKEN: refresh_token,
+                KEY_LAST_SYNC_TIME_IN_UTC: self.sync_time_in_utc_str,
+                KEY_REPORT_DAY_WATERMARKS: self.report_day_watermarks,
+                KEY_BULK_SYNC_TIMES_IN_UTC: self.bulk_sync_times_in_utc,
+            })
 
     def get_oauth_credentials(self) -> dict:
         return self.configuration.oauth_credentials  # type: ignore
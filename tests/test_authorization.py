@@ -0,0 +1,86 @@
+import threading
+import time
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from bingads.authorization import OAuthTokens
+
+from bingads_wrapper import authorization
+from bingads_wrapper.authorization import Authorization
+
+REFRESH_THREAD_COUNT = 8
+
+
+class FakeAuthentication:
+    """
+    Stands in for the OAuth authentication of the SDK, issues access tokens expiring in the given time.
+    """
+
+    def __init__(self, **kwargs):
+        self.oauth_tokens = None
+        self.expires_in_seconds = 3600
+        self.token_request_count = 0
+
+    def request_oauth_tokens_by_refresh_token(self, refresh_token: str):
+        self.token_request_count += 1
+        # give concurrent callers the chance to request the token as well
+        time.sleep(0.05)
+        self.oauth_tokens = OAuthTokens(f"access_{self.token_request_count}", self.expires_in_seconds, refresh_token)
+
+
+def create_authorization() -> Authorization:
+    with mock.patch.object(authorization, "OAuthWithAuthorizationCode", FakeAuthentication):
+        return Authorization(config_dict={"#developer_token": "developer_token"},
+                             oauth_credentials=SimpleNamespace(appKey="app", appSecret="secret",
+                                                               data={"refresh_token": "refresh_token"}),
+                             save_refresh_token_function=mock.Mock(), refresh_token_from_state=None,
+                             account_id=None, customer_id=1)
+
+
+class TestAuthorization(unittest.TestCase):
+
+    def test_account_authorizations_share_the_authentication(self):
+        customer_authorization = create_authorization()
+
+        first, second = customer_authorization.for_account(10), customer_authorization.for_account(20)
+
+        self.assertEqual((10, 20), (first.authorization_data.account_id, second.authorization_data.account_id))
+        self.assertIs(customer_authorization.authorization_data.authentication, first.authorization_data.authentication)
+        self.assertIs(customer_authorization.authorization_data.authentication,
+                      second.authorization_data.authentication)
+        self.assertEqual(1, customer_authorization.authorization_data.authentication.token_request_count)
+
+    def test_expiring_token_is_refreshed_once_by_concurrent_callers(self):
+        customer_authorization = create_authorization()
+        authentication = customer_authorization.authorization_data.authentication
+        # the current token expires within the refresh margin
+        authentication.expires_in_seconds = 60
+        authentication.request_oauth_tokens_by_refresh_token("refresh_token")
+        authentication.expires_in_seconds = 3600
+        account_authorizations = [customer_authorization.for_account(i) for i in range(REFRESH_THREAD_COUNT)]
+        barrier = threading.Barrier(REFRESH_THREAD_COUNT)
+
+        def refresh(account_authorization: Authorization):
+            barrier.wait()
+            account_authorization.refresh_access_token_if_expiring()
+
+        threads = [threading.Thread(target=refresh, args=(a,)) for a in account_authorizations]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(3, authentication.token_request_count)
+        self.assertEqual("access_3", authentication.oauth_tokens.access_token)
+
+    def test_valid_token_is_not_refreshed(self):
+        customer_authorization = create_authorization()
+
+        customer_authorization.for_account(10).refresh_access_token_if_expiring()
+
+        self.assertEqual(1, customer_authorization.authorization_data.authentication.token_request_count)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+import os
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from bingads_wrapper import bulk
+from bingads_wrapper.bulk import get_campaign_ids, get_shards, merge_bulk_files
+from bingads_wrapper.error_handling import TransientApiError
+
+HEADER = b'\xef\xbb\xbfType,Status,Id,Parent Id,Name\r\n'
+SHARED_ROWS = b'Format Version,,,,6.0\r\nAccount,Active,100,9,Account\r\n'
+
+
+class TestMergeBulkFiles(unittest.TestCase):
+
+    def test_header_and_shared_rows_are_kept_once(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            shard_paths = [os.path.join(tmp_dir, f"shard_{i}.csv") for i in range(3)]
+            with open(shard_paths[0], 'wb') as f:
+                f.write(HEADER + SHARED_ROWS + b'Campaign,Active,1,100,"multi\r\nline"\r\n')
+            with open(shard_paths[1], 'wb') as f:
+                f.write(HEADER + SHARED_ROWS)
+            with open(shard_paths[2], 'wb') as f:
+                f.write(HEADER + SHARED_ROWS + b'Keyword,Active,2,10,Account\r\n')
+            merged_path = os.path.join(tmp_dir, "merged.csv")
+
+            merge_bulk_files(shard_paths, merged_path)
+
+            with open(merged_path, 'rb') as f:
+                self.assertEqual(HEADER + SHARED_ROWS + b'Campaign,Active,1,100,"multi\r\nline"\r\n'
+                                 + b'Keyword,Active,2,10,Account\r\n', f.read())
+
+    def test_entities_outside_campaigns_are_kept_once(self):
+        header = b'\xef\xbb\xbfType,Status,Id,Parent Id,Campaign,Name\r\n'
+        account_rows = (b'Format Version,,,,,6.0\r\nAccount,Active,100,9,,Account\r\n'
+                        b'Budget,Active,5,100,,Shared budget\r\nLabel,Active,6,100,,Label\r\n')
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            shard_paths = [os.path.join(tmp_dir, f"shard_{i}.csv") for i in range(2)]
+            with open(shard_paths[0], 'wb') as f:
+                f.write(header + account_rows + b'Campaign,Active,1,100,First,\r\nAd Group,Active,5,1,First,\r\n')
+            with open(shard_paths[1], 'wb') as f:
+                f.write(header + account_rows + b'Campaign,Active,2,100,Second,\r\n')
+            merged_path = os.path.join(tmp_dir, "merged.csv")
+
+            merge_bulk_files(shard_paths, merged_path)
+
+            with open(merged_path, 'rb') as f:
+                # the ad group with the same ID as the budget is a different entity
+                self.assertEqual(header + account_rows + b'Campaign,Active,1,100,First,\r\n'
+                                 + b'Ad Group,Active,5,1,First,\r\nCampaign,Active,2,100,Second,\r\n', f.read())
+
+
+class TestGetShards(unittest.TestCase):
+
+    def test_campaign_shards_are_not_used_for_changes_or_snapshot(self):
+        config_dict = {"download_entities": ["Campaigns", "Keywords"], "shard_mode": "campaigns"}
+        with mock.patch.object(bulk, "get_campaign_ids", return_value=list(range(500))) as get_campaign_ids_mock:
+            self.assertEqual(5, len(get_shards(config_dict, mock.Mock(), is_delta=False)))
+            self.assertEqual([], get_shards(config_dict, mock.Mock(), is_delta=True))
+            self.assertEqual([], get_shards(config_dict | {"snapshot_mode": "full_table"}, mock.Mock(),
+                                            is_delta=False))
+        get_campaign_ids_mock.assert_called_once()
+
+    @mock.patch("time.sleep")
+    def test_campaign_listing_is_retried_on_transient_errors(self, _):
+        with (mock.patch.object(bulk, "ServiceClient") as service_client_class,
+              mock.patch.object(bulk, "create_transport")):
+            list_campaigns = service_client_class.return_value.GetCampaignsByAccountId
+            list_campaigns.side_effect = [TransientApiError("Internal error"),
+                                          SimpleNamespace(Campaign=[SimpleNamespace(Id=1), SimpleNamespace(Id=2)])]
+
+            self.assertEqual([1, 2], get_campaign_ids(mock.Mock()))
+
+        self.assertEqual(2, list_campaigns.call_count)
+        self.assertIn("ObjectiveBased", list_campaigns.call_args.kwargs["CampaignType"].split())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -3,12 +3,17 @@ Created on 12. 11. 2018
 
 @author: esner
 """
+import threading
 import unittest
 import mock
 import os
+import tempfile
+from datetime import date
+from types import SimpleNamespace
 from freezegun import freeze_time
 
-from component import BingAdsExtractor
+from bingads_wrapper.snapshot import BulkSnapshotStore, SnapshotMode
+from component import BingAdsExtractor, DownloadTask, ResultFile, run_in_parallel
 
 
 class TestComponent(unittest.TestCase):
@@ -22,6 +27,115 @@ class TestComponent(unittest.TestCase):
             comp = BingAdsExtractor()
             comp.run()
 
+    def test_day_watermarks_stop_at_the_last_complete_day(self):
+        component = SimpleNamespace(report_day_watermarks={"1": "2024-01-25", "3": "2024-02-01"},
+                                    new_sync_time_in_utc_str="2024-01-31T15:00:00+00:00")
+        tasks = [DownloadTask(name="1", accounts=["1", "2"], date_range=(date(2024, 1, 20), date(2024, 1, 31))),
+                 DownloadTask(name="3", accounts=["3"], date_range=(date(2024, 1, 1), date(2024, 1, 10)))]
+
+        BingAdsExtractor._update_report_day_watermarks(component, tasks)
+
+        # today is not complete yet, watermarks never move back
+        self.assertEqual({"1": "2024-01-30", "2": "2024-01-30", "3": "2024-02-01"}, component.report_day_watermarks)
+
+    def test_bulk_sync_times_are_kept_for_accounts_not_downloaded(self):
+        component = SimpleNamespace(bulk_sync_times_in_utc={"1": "2024-01-01T00:00:00+00:00",
+                                                            "3": "2024-01-01T00:00:00+00:00"},
+                                    new_sync_time_in_utc_str="2024-01-31T15:00:00+00:00")
+
+        BingAdsExtractor._update_bulk_sync_times(component, [DownloadTask(name="1", accounts=["1"]),
+                                                             DownloadTask(name="2", accounts=["2"])])
+
+        self.assertEqual({"1": "2024-01-31T15:00:00+00:00", "2": "2024-01-31T15:00:00+00:00",
+                          "3": "2024-01-01T00:00:00+00:00"}, component.bulk_sync_times_in_utc)
+
+    def test_full_table_snapshot_exports_accounts_without_changes(self):
+        columns = ["Type", "Status", "Id", "Parent Id", "Name"]
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            store = BulkSnapshotStore(os.path.join(tmp_dir, "snapshot.sqlite"), "fingerprint")
+            with open(os.path.join(tmp_dir, "full.csv"), "wb") as f:
+                f.write(b"Campaign,Active,1,2,First\r\n")
+            store.apply("2", columns, os.path.join(tmp_dir, "full.csv"), is_delta=False)
+            component = SimpleNamespace(bulk_snapshot=store, write_manifest=mock.Mock(), _bulk_snapshot_file=None)
+            download_requests = {
+                task_name: SimpleNamespace(result_file_name="Entities.csv", result_file_directory=tmp_dir,
+                                           primary_key=["Type", "Id"], is_delta=True, has_header=True, columns=None)
+                for task_name in ("2", "3")}
+
+            # neither account has downloaded changes, only account 2 is in the snapshot
+            results = BingAdsExtractor._apply_bulk_snapshot(
+                component, [DownloadTask(name="2", accounts=["2"]), DownloadTask(name="3", accounts=["3"])],
+                [None, None], SnapshotMode.FULL_TABLE, download_requests)
+
+            self.assertIsNone(results[1])
+            self.assertEqual(columns, results[0].columns)
+            with open(results[0].new_result_full_path, "rb") as f:
+                self.assertEqual(b"Campaign,Active,1,2,First\r\n", f.read())
+
+    def test_full_table_snapshot_keeps_delta_of_account_without_snapshot(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            store = BulkSnapshotStore(os.path.join(tmp_dir, "snapshot.sqlite"), "fingerprint")
+            with open(os.path.join(tmp_dir, "full.csv"), "wb") as f:
+                f.write(b"Campaign,Active,1,2,First\r\n")
+            store.apply("2", ["Type", "Status", "Id", "Parent Id", "Name"], os.path.join(tmp_dir, "full.csv"),
+                        is_delta=False)
+            with open(os.path.join(tmp_dir, "delta.csv"), "wb") as f:
+                f.write(b"Campaign,Paused,1,2\r\n")
+            component = SimpleNamespace(bulk_snapshot=store, write_manifest=mock.Mock(), _bulk_snapshot_file=None)
+            # the delta of account 2 has different columns than its snapshot, account 3 has no snapshot
+            results = [SimpleNamespace(columns=["Type", "Status", "Id", "Parent Id"], is_delta=True,
+                                       new_result_full_path=os.path.join(tmp_dir, "delta.csv")),
+                       SimpleNamespace(columns=["Type", "Status", "Id", "Parent Id", "Name"], is_delta=True,
+                                       new_result_full_path=os.path.join(tmp_dir, "full.csv"))]
+
+            with self.assertLogs(level="WARNING") as logs:
+                BingAdsExtractor._apply_bulk_snapshot(
+                    component, [DownloadTask(name="2", accounts=["2"]), DownloadTask(name="3", accounts=["3"])],
+                    results, SnapshotMode.FULL_TABLE, {})
+
+            self.assertEqual(set(), store.accounts)
+            with open(os.path.join(tmp_dir, "delta.csv"), "rb") as f:
+                self.assertEqual(b"Campaign,Paused,1,2\r\n", f.read())
+            with open(os.path.join(tmp_dir, "full.csv"), "rb") as f:
+                self.assertEqual(b"Campaign,Active,1,2,First\r\n", f.read())
+            self.assertEqual(2, sum("contains only the changes downloaded" in line for line in logs.output))
+
+
+class TestRunInParallel(unittest.TestCase):
+
+    def test_results_are_returned_in_order_of_items(self):
+        second_done = threading.Event()
+        completed = []
+
+        def process(item):
+            if item == 0:
+                second_done.wait(5)
+            completed.append(item)
+            second_done.set()
+            return item * 10
+
+        self.assertEqual([0, 10], run_in_parallel(process, [0, 1], 2))
+        self.assertEqual([1, 0], completed)
+
+
+class TestResultFile(unittest.TestCase):
+
+    def test_remove_header_keeps_rows_byte_identical(self):
+        rows = b'"2024-01-01","a ""quoted"" value","1"\r\n"2024-01-02","multi\nline","2"\r\n'
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            with open(os.path.join(tmp_dir, "report.csv"), "wb") as f:
+                f.write(b'\xef\xbb\xbf"TimePeriod","Name","AccountId"\r\n' + rows)
+            download_request = SimpleNamespace(result_file_name="report.csv", result_file_directory=tmp_dir,
+                                               primary_key=["TimePeriod", "AccountId"], has_header=True,
+                                               is_delta=False)
+
+            result = ResultFile(download_request=download_request, slice_prefix="123")
+
+            self.assertEqual(result.columns, ["TimePeriod", "Name", "AccountId"])
+            self.assertFalse(os.path.exists(os.path.join(tmp_dir, "report.csv")))
+            with open(result.new_result_full_path, "rb") as f:
+                self.assertEqual(f.read(), rows)
+
 
 if __name__ == "__main__":
     # import sys;sys.argv = ['', 'Test.testName']
@@ -0,0 +1,36 @@
+import threading
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from bingads_wrapper import customer_management
+from bingads_wrapper.customer_management import CustomerManagementServiceClient
+
+
+class FakeServiceClient:
+    instances: list["FakeServiceClient"] = []
+
+    def __init__(self, **kwargs):
+        self.thread = threading.current_thread()
+        FakeServiceClient.instances.append(self)
+
+    def GetUser(self, UserId):
+        roles = [SimpleNamespace(CustomerId=customer_id) for customer_id in (3, 1, 2, 1)]
+        return SimpleNamespace(CustomerRoles=SimpleNamespace(CustomerRole=roles))
+
+    def GetCustomer(self, CustomerId):
+        # suds clients must not be shared by threads
+        assert threading.current_thread() is self.thread
+        return SimpleNamespace(Id=CustomerId)
+
+
+class TestGetCustomers(unittest.TestCase):
+
+    def test_customers_are_returned_in_role_order_without_duplicates(self):
+        FakeServiceClient.instances = []
+        authorization = SimpleNamespace(authorization_data=None, environment="production", developer_token="token",
+                                        customer_id=None)
+        with mock.patch.object(customer_management, "ServiceClient", FakeServiceClient):
+            customers = CustomerManagementServiceClient(authorization=authorization).get_customers()
+        self.assertEqual([3, 1, 2], [customer.Id for customer in customers])
+        self.assertLessEqual(len(FakeServiceClient.instances), 4)
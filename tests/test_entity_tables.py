@@ -0,0 +1,56 @@
+import csv
+import os
+import tempfile
+import unittest
+
+from bingads_wrapper.entity_tables import (find_non_empty_column_indexes, project_csv_file, select_column_indexes,
+                                           split_bulk_file_by_entity_type)
+
+COLUMNS = ["Type", "Status", "Id", "Parent Id", "Campaign", "Keyword"]
+
+
+class TestSplitBulkFileByEntityType(unittest.TestCase):
+
+    def test_rows_are_routed_by_type_and_projected_to_used_columns(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            bulk_file = os.path.join(tmp_dir, "bulk.csv")
+            with open(bulk_file, 'w', newline='') as f:
+                csv.writer(f).writerows([
+                    ["Format Version", "", "", "", "6.0", ""],
+                    ["Campaign", "Active", "1", "100", "First", ""],
+                    ["Keyword", "Active", "20", "10", "", "multi\nline"],
+                    ["Campaign", "Paused", "2", "100", "Second", ""],
+                ])
+            tables = {}
+            split_bulk_file_by_entity_type(bulk_file, COLUMNS, "Entities.csv", "100_Entities.csv",
+                                           os.path.join(tmp_dir, "types"), tables)
+
+            self.assertEqual(["Campaign", "Keyword"], sorted(tables))
+            self.assertEqual("Entities_Campaign.csv", tables["Campaign"].table_file_name)
+            self.assertEqual({0, 1, 2, 3, 4}, tables["Campaign"].non_empty_column_indexes)
+            self.assertEqual({0, 1, 2, 3, 5}, tables["Keyword"].non_empty_column_indexes)
+
+            projected_file = os.path.join(tmp_dir, "keywords.csv")
+            project_csv_file(tables["Keyword"].file_paths[0], projected_file, [0, 2, 5])
+            with open(projected_file, newline='') as f:
+                self.assertEqual([["Keyword", "20", "multi\nline"]], list(csv.reader(f)))
+
+
+class TestColumnSelection(unittest.TestCase):
+
+    def test_empty_and_not_allowed_columns_are_dropped_except_primary_key(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            bulk_file = os.path.join(tmp_dir, "bulk.csv")
+            with open(bulk_file, 'w', newline='') as f:
+                csv.writer(f).writerows([["Campaign", "Active", "", "", "First", ""],
+                                         ["Campaign", "Paused", "", "100", "Second", ""]])
+
+            non_empty_column_indexes = find_non_empty_column_indexes([bulk_file], len(COLUMNS))
+
+        self.assertEqual({0, 1, 3, 4}, non_empty_column_indexes)
+        self.assertEqual([0, 2, 4], select_column_indexes(COLUMNS, ["Type", "Id"], ["Campaign", "Keyword"],
+                                                          non_empty_column_indexes))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,32 @@
+import unittest
+from types import SimpleNamespace
+
+from keboola.component.exceptions import UserException
+from suds import WebFault
+
+from bingads_wrapper.error_handling import TransientApiError, process_webfault_errors
+
+
+def create_webfault(*errors: tuple[int, str], faultstring: str = "Fault") -> WebFault:
+    api_errors = [SimpleNamespace(Code=code, ErrorCode=error_code, Message=error_code) for code, error_code in errors]
+    detail = SimpleNamespace(AdApiFaultDetail=SimpleNamespace(Errors=SimpleNamespace(AdApiError=api_errors)))
+    return WebFault(SimpleNamespace(detail=detail, faultstring=faultstring), None)
+
+
+class TestProcessWebfaultErrors(unittest.TestCase):
+
+    def test_internal_error_and_throttling_are_transient(self):
+        with self.assertRaises(TransientApiError):
+            process_webfault_errors(create_webfault((0, "InternalError"), (117, "CallRateExceeded")))
+
+    def test_timeouts_are_transient(self):
+        for webfault in (create_webfault((0, "InternalError"), (5000, "RequestTimeout")),
+                         create_webfault(faultstring="The request channel timed out while waiting for a reply.")):
+            with self.assertRaises(TransientApiError):
+                process_webfault_errors(webfault)
+
+    def test_other_errors_are_permanent(self):
+        for errors in (((105, "InvalidCredentials"),), ((0, "InternalError"), (2019, "InvalidColumn"))):
+            with self.assertRaises(UserException) as context:
+                process_webfault_errors(create_webfault(*errors))
+            self.assertNotIsInstance(context.exception, TransientApiError)
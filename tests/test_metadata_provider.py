@@ -0,0 +1,35 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from bingads_wrapper import metadata_provider
+from bingads_wrapper.metadata_provider import (BINGADS_VERSION, KEY_BINGADS_VERSION, KEY_BULK_ENTITIES,
+                                               KEY_CAMPAIGN_TYPES, KEY_REPORT_COLUMNS, load_metadata_index)
+
+
+class TestLoadMetadataIndex(unittest.TestCase):
+
+    def _write_index(self, tmp_dir: str, bingads_version: str) -> str:
+        path = os.path.join(tmp_dir, "metadata_index.json")
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({KEY_BINGADS_VERSION: bingads_version, KEY_REPORT_COLUMNS: {"Account": ["AccountId"]},
+                       KEY_BULK_ENTITIES: ["Campaigns"], KEY_CAMPAIGN_TYPES: ["Search"]}, f)
+        return path
+
+    def test_index_of_installed_version_is_used(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = self._write_index(tmp_dir, BINGADS_VERSION)
+            with mock.patch.object(metadata_provider, "create_metadata_index") as create_metadata_index:
+                metadata_index = load_metadata_index(path)
+            create_metadata_index.assert_not_called()
+            self.assertEqual({"Account": ["AccountId"]}, metadata_index[KEY_REPORT_COLUMNS])
+
+    def test_wsdls_are_parsed_if_index_is_stale_or_missing(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for path in (self._write_index(tmp_dir, "0.0.0"), os.path.join(tmp_dir, "missing.json")):
+                metadata_index = load_metadata_index(path)
+                self.assertIn("CampaignPerformance", metadata_index[KEY_REPORT_COLUMNS])
+                self.assertIn("Campaigns", metadata_index[KEY_BULK_ENTITIES])
+                self.assertIn("PerformanceMax", metadata_index[KEY_CAMPAIGN_TYPES])
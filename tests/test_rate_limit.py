@@ -0,0 +1,42 @@
+import unittest
+from unittest import mock
+
+from bingads_wrapper import rate_limit
+from bingads_wrapper.rate_limit import BURST_SECONDS, RateLimiter
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float):
+        self.now += seconds
+
+
+class TestRateLimiter(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = mock.patch.multiple(rate_limit.time, monotonic=self.clock.monotonic, sleep=self.clock.sleep)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_calls_are_limited_to_the_rate_after_a_burst(self):
+        rate_limiter = RateLimiter(calls_per_second=5)
+        for _ in range(5 * BURST_SECONDS + 10):
+            rate_limiter.acquire()
+        self.assertAlmostEqual(2.0, self.clock.now)
+
+    def test_throttling_pauses_calls_and_halves_the_rate(self):
+        rate_limiter = RateLimiter(calls_per_second=4)
+        rate_limiter.on_throttled(delay_seconds=10)
+        rate_limiter.acquire()
+        self.assertGreaterEqual(self.clock.now, 10)
+        self.assertEqual(2, rate_limiter.rate)
+        for _ in range(100):
+            rate_limiter.on_success()
+        self.assertEqual(4, rate_limiter.rate)
@@ -0,0 +1,81 @@
+import unittest
+from datetime import date, datetime, timezone
+from unittest import mock
+
+from keboola.component.exceptions import UserException
+
+from bingads_wrapper.prebuilt_configs import PREBUILT_CONFIGS, get_prebuilt_report_config
+from bingads_wrapper.reporting import (ReportingDownloadParametersFactory, get_account_date_ranges,
+                                       get_last_complete_day, get_report_date_windows)
+
+
+class TestAccountDateRanges(unittest.TestCase):
+
+    def test_date_range_starts_lookback_days_before_day_after_watermark(self):
+        config_dict = {"time_range": {"period": "CustomTimeRange", "date_from": "2024-01-01",
+                                      "date_to": "2024-01-31", "day_watermarks": True, "lookback_days": 3}}
+        watermarks = {"1": "2024-01-20", "2": "2023-06-01", "3": "2024-01-31"}
+
+        date_ranges = get_account_date_ranges(config_dict, ["1", "2", "3", "4"], watermarks, None)
+
+        self.assertEqual((date(2024, 1, 18), date(2024, 1, 31)), date_ranges["1"])
+        # never before Date From
+        self.assertEqual((date(2024, 1, 1), date(2024, 1, 31)), date_ranges["2"])
+        self.assertEqual((date(2024, 1, 29), date(2024, 1, 31)), date_ranges["3"])
+        # no watermark, initial backfill
+        self.assertEqual((date(2024, 1, 1), date(2024, 1, 31)), date_ranges["4"])
+
+    def test_disabled_without_day_watermarks(self):
+        config_dict = {"time_range": {"period": "CustomTimeRange", "date_from": "2024-01-01",
+                                      "date_to": "2024-01-31"}}
+        self.assertIsNone(get_account_date_ranges(config_dict, ["1"], {"1": "2024-01-20"}, None))
+
+    def test_last_complete_day_ended_in_all_time_zones(self):
+        self.assertEqual(date(2024, 1, 29), get_last_complete_day(datetime(2024, 1, 31, 2, tzinfo=timezone.utc)))
+        self.assertEqual(date(2024, 1, 30), get_last_complete_day(datetime(2024, 1, 31, 12, tzinfo=timezone.utc)))
+
+
+class TestReportDateWindows(unittest.TestCase):
+
+    def test_custom_time_range_is_split_into_windows(self):
+        config_dict = {"time_range": {"period": "CustomTimeRange", "date_window_days": 7}}
+
+        windows = get_report_date_windows(config_dict, None, (date(2024, 1, 1), date(2024, 1, 10)))
+
+        self.assertEqual([(date(2024, 1, 1), date(2024, 1, 7)), (date(2024, 1, 8), date(2024, 1, 10))], windows)
+
+    def test_negative_window_days_are_rejected(self):
+        config_dict = {"time_range": {"period": "CustomTimeRange", "date_window_days": -1}}
+        with self.assertRaises(UserException):
+            get_report_date_windows(config_dict, None, (date(2024, 1, 1), date(2024, 1, 10)))
+
+
+class TestSharedColumnLists(unittest.TestCase):
+
+    def test_configured_lists_are_not_modified(self):
+        config_dict = {"report_type": "CampaignPerformance", "columns_array": ["TimePeriod", "Clicks"],
+                       "primary_key_array": ["TimePeriod"], "aggregation": "Daily",
+                       "return_only_complete_data": False,
+                       "time_range": {"period": "LastWeek", "time_zone": "PacificTimeUSCanadaTijuana"}}
+
+        factory = ReportingDownloadParametersFactory(reporting_service=mock.Mock(), config_dict=config_dict,
+                                                     result_file_directory="", report_file_format="Csv")
+
+        self.assertEqual(["TimePeriod", "Clicks", "AccountId"], factory.columns)
+        self.assertEqual(["TimePeriod", "AccountId"], factory.primary_key)
+        self.assertEqual(["TimePeriod", "Clicks"], config_dict["columns_array"])
+        self.assertEqual(["TimePeriod"], config_dict["primary_key_array"])
+
+    def test_prebuilt_config_lists_are_copies(self):
+        preset_name = next(iter(PREBUILT_CONFIGS))
+        aggregation = next(iter(PREBUILT_CONFIGS[preset_name].columns_and_primary_key_by_aggregation))
+        config = get_prebuilt_report_config(preset_name, aggregation)
+        config["columns"].append("Extra")
+        config["primary_key"].append("Extra")
+
+        self.assertNotIn("Extra", get_prebuilt_report_config(preset_name, aggregation)["columns"])
+        self.assertNotIn("Extra", get_prebuilt_report_config(preset_name, aggregation)["primary_key"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,310 @@
+import io
+import os
+import tempfile
+import unittest
+import urllib.error
+import zipfile
+from types import SimpleNamespace
+from typing import Optional
+from unittest import mock
+
+import requests
+from bingads.exceptions import FileDownloadException
+
+from bingads_wrapper import request
+from bingads_wrapper.error_handling import TransientApiError
+from bingads_wrapper.request import (REPORT_POLL_MAX_INTERVAL_SECONDS, BulkDownloadRequest, ReportDownloadRequest,
+                                     process_report_download_requests)
+
+DOWNLOAD_URL = "https://download.example.com/report.zip"
+CONTENT = b'\xef\xbb\xbf"TimePeriod","AccountId"\r\n' + b"".join(b'"%d","1"\r\n' % i for i in range(10000))
+
+
+def _create_archive(content: bytes = CONTENT) -> bytes:
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w", zipfile.ZIP_DEFLATED) as zip_file:
+        zip_file.writestr("report.csv", content)
+    return archive.getvalue()
+
+
+ARCHIVE = _create_archive()
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float):
+        self.now += seconds
+
+
+class FakeResponse:
+    """
+    Streamed download response, the connection drops after fail_after bytes of the body if specified.
+    """
+
+    def __init__(self, status_code: int, body: bytes = b"", headers: Optional[dict] = None,
+                 fail_after: Optional[int] = None):
+        self.status_code = status_code
+        self.body = body
+        self.headers = headers or {}
+        self.fail_after = fail_after
+
+    def iter_content(self, chunk_size: int):
+        body = self.body if self.fail_after is None else self.body[:self.fail_after]
+        for i in range(0, len(body), 1000):
+            yield body[i:i + 1000]
+        if self.fail_after is not None:
+            raise requests.exceptions.ChunkedEncodingError("Connection broken")
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} Error")
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+def create_report_download_request(result_file_directory: str = "", statuses: tuple[str, ...] = (),
+                                   **kwargs) -> ReportDownloadRequest:
+    """
+    Creates a report download request without the SDK service, its operation returns the given statuses.
+    """
+    with (mock.patch.object(request, "ReportingServiceManager"),
+          mock.patch.object(request, "ReportingDownloadParametersFactory"),
+          mock.patch.object(request, "create_transport")):
+        download_request = ReportDownloadRequest(authorization=mock.Mock(), config_dict={},
+                                                 result_file_directory=result_file_directory, table_name="Report",
+                                                 **kwargs)
+    operation = download_request._service_manager.submit_download.return_value
+    operation.service_client.PollGenerateReport.side_effect = [
+        SimpleNamespace(Status=status, ReportDownloadUrl=DOWNLOAD_URL) for status in statuses]
+    return download_request
+
+
+class TestProcessReportDownloadRequests(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = mock.patch.multiple(request.time, monotonic=self.clock.monotonic, sleep=self.clock.sleep)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_reports_are_downloaded_as_they_become_ready(self):
+        slow_report = create_report_download_request("slow", ("Pending", "Pending", "Pending", "Success"))
+        fast_report = create_report_download_request("fast", ("Success",))
+        downloaded = []
+
+        with mock.patch.object(ReportDownloadRequest, "download", autospec=True,
+                               side_effect=lambda r: downloaded.append(r.result_file_directory)):
+            results = process_report_download_requests([slow_report, fast_report],
+                                                       post_process=lambda r: r.result_file_directory,
+                                                       parallelism=2)
+
+        # results keep the order of the requests, reports are downloaded in the order they became ready
+        self.assertEqual(["slow", "fast"], results)
+        self.assertEqual(["fast", "slow"], downloaded)
+        self.assertIsNot(slow_report._operation, fast_report._operation)
+        self.assertEqual(4, slow_report._operation.service_client.PollGenerateReport.call_count)
+        self.assertEqual(1, fast_report._operation.service_client.PollGenerateReport.call_count)
+
+
+class TestReportStatusPolling(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = mock.patch.multiple(request.time, monotonic=self.clock.monotonic, sleep=self.clock.sleep)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_poll_interval_grows_up_to_the_maximum(self):
+        download_request = create_report_download_request()
+        poll_times = []
+
+        def poll_generate_report(request_id):
+            poll_times.append(self.clock.now)
+            # no download URL, the report is empty
+            return SimpleNamespace(Status="Pending" if len(poll_times) < 12 else "Success", ReportDownloadUrl=None)
+
+        operation = download_request._service_manager.submit_download.return_value
+        operation.service_client.PollGenerateReport.side_effect = poll_generate_report
+        with self.assertLogs(level="INFO") as logs:
+            download_request.process()
+
+        intervals = [round(b - a, 3) for a, b in zip([0.0] + poll_times, poll_times)]
+        self.assertEqual([1, 1.5, 2.25, 3.375, 5.062, 7.594, 11.391, 17.086, 25.629,
+                          REPORT_POLL_MAX_INTERVAL_SECONDS, REPORT_POLL_MAX_INTERVAL_SECONDS,
+                          REPORT_POLL_MAX_INTERVAL_SECONDS], intervals)
+        self.assertIn(f"was ready {poll_times[-1]:.1f} s after submission (12 status poll(s))", logs.output[-1])
+
+
+class TestDownloadStepRetries(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = mock.patch.multiple(request.time, monotonic=self.clock.monotonic, sleep=self.clock.sleep)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.result_file_directory = temp_dir.name
+
+    def test_only_failed_report_step_is_retried(self):
+        download_request = create_report_download_request(self.result_file_directory)
+        download_request._download_parameters.decompress_result_file = True
+        submit_download = download_request._service_manager.submit_download
+        operation = submit_download.return_value
+        submit_download.side_effect = [TransientApiError("Internal error"), operation]
+        operation.service_client.PollGenerateReport.side_effect = [
+            SimpleNamespace(Status="Pending", ReportDownloadUrl=None),
+            urllib.error.URLError(TimeoutError("timed out")),
+            SimpleNamespace(Status="Success", ReportDownloadUrl=DOWNLOAD_URL)]
+        session = mock.Mock()
+        session.get.side_effect = [requests.ConnectionError("Connection reset"), FakeResponse(200, ARCHIVE)]
+
+        with mock.patch.object(request, "get_http_session", return_value=session):
+            download_request.process()
+
+        self.assertEqual(2, submit_download.call_count)
+        self.assertEqual(3, operation.service_client.PollGenerateReport.call_count)
+        self.assertEqual(2, session.get.call_count)
+        with open(os.path.join(self.result_file_directory, "Report.csv"), "rb") as result_file:
+            self.assertEqual(CONTENT, result_file.read())
+
+    def test_truncated_report_stream_is_downloaded_again(self):
+        download_request = create_report_download_request(self.result_file_directory, ("Success",),
+                                                          stream_download=True)
+        session = mock.Mock()
+        session.get.side_effect = [FakeResponse(200, ARCHIVE[:len(ARCHIVE) // 2]), FakeResponse(200, ARCHIVE)]
+
+        with mock.patch.object(request, "get_http_session", return_value=session):
+            download_request.process()
+
+        self.assertEqual(2, session.get.call_count)
+        self.assertEqual(1, download_request._operation.service_client.PollGenerateReport.call_count)
+        with open(os.path.join(self.result_file_directory, "Report.csv"), "rb") as result_file:
+            self.assertEqual(CONTENT.split(b"\r\n", 1)[1], result_file.read())
+
+    def test_only_failed_bulk_step_is_retried(self):
+        with (mock.patch.object(request, "BulkServiceManager"),
+              mock.patch.object(request, "create_bulk_download_parameters"),
+              mock.patch.object(request, "create_transport")):
+            download_request = BulkDownloadRequest(authorization=mock.Mock(), config_dict={},
+                                                   result_file_directory=self.result_file_directory)
+        submit_download = download_request._service_manager.submit_download
+        operation = submit_download.return_value
+        submit_download.side_effect = [TransientApiError("Internal error"), operation]
+        operation.track.side_effect = [urllib.error.URLError("Connection refused"), TimeoutError("timed out"), None]
+        operation.download_result_file.side_effect = [FileDownloadException("Download failed"), None]
+
+        with mock.patch.object(request, "get_bulk_shards", return_value=[]):
+            download_request.process()
+
+        self.assertEqual(2, submit_download.call_count)
+        self.assertEqual(3, operation.track.call_count)
+        self.assertEqual(2, operation.download_result_file.call_count)
+
+
+class TestArchivedReportDownload(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = mock.patch.multiple(request.time, monotonic=self.clock.monotonic, sleep=self.clock.sleep)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.result_file_directory = temp_dir.name
+        self.archive_path = os.path.join(self.result_file_directory, "Report.zip")
+        self.download_request = create_report_download_request(self.result_file_directory, ("Success",))
+        self.download_request._download_parameters.decompress_result_file = True
+        self.session = mock.Mock()
+        patcher = mock.patch.object(request, "get_http_session", return_value=self.session)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _write_archive(self, content: bytes):
+        with open(self.archive_path, "wb") as archive_file:
+            archive_file.write(content)
+
+    def _get_range_headers(self) -> list[Optional[str]]:
+        return [call.kwargs["headers"].get("Range") for call in self.session.get.call_args_list]
+
+    def _assert_result_file(self):
+        with open(os.path.join(self.result_file_directory, "Report.csv"), "rb") as result_file:
+            self.assertEqual(CONTENT, result_file.read())
+        self.assertFalse(os.path.exists(self.archive_path))
+
+    def test_interrupted_download_is_resumed(self):
+        self.session.get.side_effect = [
+            FakeResponse(200, ARCHIVE, fail_after=5000),
+            FakeResponse(206, ARCHIVE[5000:], {"Content-Range": f"bytes 5000-{len(ARCHIVE) - 1}/{len(ARCHIVE)}"})]
+
+        self.download_request.process()
+
+        self.assertEqual([None, "bytes=5000-"], self._get_range_headers())
+        self._assert_result_file()
+
+    def test_whole_archive_is_written_from_the_start_if_range_is_ignored(self):
+        self._write_archive(ARCHIVE[:5000])
+        self.session.get.side_effect = [FakeResponse(200, ARCHIVE)]
+
+        self.download_request.process()
+
+        self.assertEqual(["bytes=5000-"], self._get_range_headers())
+        self._assert_result_file()
+
+    def test_completely_received_archive_is_not_downloaded_again(self):
+        self._write_archive(ARCHIVE)
+        self.session.get.side_effect = [FakeResponse(416)]
+
+        self.download_request.process()
+
+        self.assertEqual([f"bytes={len(ARCHIVE)}-"], self._get_range_headers())
+        self._assert_result_file()
+
+    def test_archive_is_downloaded_again_if_content_range_does_not_match(self):
+        self._write_archive(ARCHIVE[:5000])
+        self.session.get.side_effect = [
+            FakeResponse(206, ARCHIVE, {"Content-Range": f"bytes 0-{len(ARCHIVE) - 1}/{len(ARCHIVE)}"}),
+            FakeResponse(200, ARCHIVE)]
+
+        self.download_request.process()
+
+        self.assertEqual(["bytes=5000-", None], self._get_range_headers())
+        self._assert_result_file()
+
+    def test_expired_url_is_refreshed(self):
+        refreshed_url = "https://download.example.com/refreshed.zip"
+        self.download_request._service_manager.submit_download.return_value.service_client.PollGenerateReport\
+            .side_effect = [SimpleNamespace(Status="Success", ReportDownloadUrl=DOWNLOAD_URL),
+                            SimpleNamespace(Status="Success", ReportDownloadUrl=refreshed_url)]
+        self.session.get.side_effect = [FakeResponse(403), FakeResponse(200, ARCHIVE)]
+
+        self.download_request.process()
+
+        self.assertEqual([DOWNLOAD_URL, refreshed_url], [call.args[0] for call in self.session.get.call_args_list])
+        self._assert_result_file()
+
+    def test_corrupted_archive_is_removed_and_downloaded_again(self):
+        self._write_archive(b"x" * len(ARCHIVE))
+        self.session.get.side_effect = [FakeResponse(416), FakeResponse(200, ARCHIVE)]
+
+        self.download_request.process()
+
+        self.assertEqual([f"bytes={len(ARCHIVE)}-", None], self._get_range_headers())
+        self._assert_result_file()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,62 @@
+import csv
+import os
+import tempfile
+import unittest
+
+from bingads_wrapper.snapshot import BulkSnapshotStore
+
+COLUMNS = ["Type", "Status", "Id", "Parent Id", "Campaign", "Keyword"]
+
+
+def _write_rows(path: str, rows: list[list[str]]):
+    with open(path, 'w', newline='') as f:
+        csv.writer(f).writerows(rows)
+
+
+class TestBulkSnapshotStore(unittest.TestCase):
+
+    def test_delta_is_merged_into_full_snapshot(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            bulk_file = os.path.join(tmp_dir, "bulk.csv")
+            store = BulkSnapshotStore(os.path.join(tmp_dir, "snapshot.sqlite"), "fingerprint")
+            _write_rows(bulk_file, [
+                ["Campaign", "Active", "1", "100", "First", ""],
+                ["Campaign", "Active", "2", "100", "Second", ""],
+                ["Ad Group", "Active", "10", "1", "First", ""],
+                ["Keyword", "Active", "20", "10", "First", "multi\nline"],
+                ["Keyword", "Active", "21", "3", "Other", "kept"],
+            ])
+            store.apply("100", COLUMNS, bulk_file, is_delta=False)
+            _write_rows(bulk_file, [
+                ["Campaign", "Deleted", "1", "100", "First", ""],
+                ["Campaign", "Paused", "2", "100", "Second renamed", ""],
+                ["Campaign", "Active", "4", "100", "New", ""],
+            ])
+            store.apply("100", COLUMNS, bulk_file, is_delta=True)
+            store.export("100", bulk_file)
+            store.close()
+
+            with open(bulk_file, newline='') as f:
+                rows = list(csv.reader(f))
+
+        # deleted campaign is removed together with its ad group and keyword
+        self.assertEqual([
+            ["Keyword", "Active", "21", "3", "Other", "kept"],
+            ["Campaign", "Paused", "2", "100", "Second renamed", ""],
+            ["Campaign", "Active", "4", "100", "New", ""],
+        ], rows)
+
+    def test_delta_with_different_columns_drops_account(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            bulk_file = os.path.join(tmp_dir, "bulk.csv")
+            store = BulkSnapshotStore(os.path.join(tmp_dir, "snapshot.sqlite"), "fingerprint")
+            _write_rows(bulk_file, [["Campaign", "Active", "1", "100", "First", ""]])
+            store.apply("100", COLUMNS, bulk_file, is_delta=False)
+            store.apply("100", COLUMNS + ["New Column"], bulk_file, is_delta=True)
+
+            self.assertNotIn("100", store.accounts)
+            store.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
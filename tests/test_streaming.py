@@ -0,0 +1,66 @@
+import io
+import unittest
+import zipfile
+
+from bingads_wrapper.streaming import iter_zip_member_content, split_first_line
+
+CONTENT = b'\xef\xbb\xbf"TimePeriod","AccountId"\r\n' + b"".join(b'"%d","1"\r\n' % i for i in range(10000))
+
+
+def _chunked(data: bytes, chunk_size: int = 1000):
+    return (data[i:i + chunk_size] for i in range(0, len(data), chunk_size))
+
+
+class _NonSeekableStream(io.RawIOBase):
+    """Forces zipfile to write data descriptors, as servers streaming archives do."""
+
+    def __init__(self):
+        self.data = bytearray()
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self.data += b
+        return len(b)
+
+
+class TestStreaming(unittest.TestCase):
+
+    def test_zip_member_is_decompressed_from_chunks(self):
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, "w", zipfile.ZIP_DEFLATED) as zip_file:
+            zip_file.writestr("report.csv", CONTENT)
+
+        self.assertEqual(b"".join(iter_zip_member_content(_chunked(archive.getvalue()))), CONTENT)
+
+    def test_zip_member_with_data_descriptor_is_decompressed_from_chunks(self):
+        stream = _NonSeekableStream()
+        with zipfile.ZipFile(stream, "w", zipfile.ZIP_DEFLATED) as zip_file:
+            with zip_file.open("report.csv", "w") as f:
+                f.write(CONTENT)
+
+        self.assertEqual(b"".join(iter_zip_member_content(_chunked(bytes(stream.data)))), CONTENT)
+
+    def test_truncated_or_corrupted_archive_raises_bad_zip_file(self):
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, "w", zipfile.ZIP_DEFLATED) as zip_file:
+            zip_file.writestr("report.csv", CONTENT)
+        data = archive.getvalue()
+        corrupted = bytearray(data)
+        # CRC of the local file header
+        corrupted[14] ^= 0xFF
+
+        for name, chunks in (("truncated", _chunked(data[:len(data) // 2])), ("corrupted", _chunked(corrupted))):
+            with self.subTest(name), self.assertRaises(zipfile.BadZipFile):
+                b"".join(iter_zip_member_content(chunks))
+
+    def test_split_first_line(self):
+        header, rest = split_first_line(_chunked(CONTENT, 7))
+
+        self.assertEqual(header, b'\xef\xbb\xbf"TimePeriod","AccountId"\r\n')
+        self.assertEqual(b"".join(rest), CONTENT[len(header):])
+
+
+if __name__ == "__main__":
+    unittest.main()
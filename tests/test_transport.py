@@ -0,0 +1,59 @@
+import unittest
+import urllib.error
+from types import SimpleNamespace
+from unittest import mock
+
+import requests
+from suds.transport import Request, TransportError
+
+from bingads_wrapper.rate_limit import RateLimiter
+from bingads_wrapper.transport import SessionTransport
+
+
+class TestSessionTransport(unittest.TestCase):
+
+    def _send(self, rate_limiters=None, **post_kwargs):
+        session = mock.Mock(spec=requests.Session)
+        session.post = mock.Mock(**post_kwargs)
+        return SessionTransport(session, rate_limiters).send(
+            Request("https://example.com/Service.svc", b"<Envelope/>", 30))
+
+    def test_reply_content_is_returned(self):
+        response = SimpleNamespace(status_code=200, headers={}, content=b"<Reply/>", reason="OK")
+        self.assertEqual(b"<Reply/>", self._send(return_value=response).message)
+
+    def test_soap_fault_is_raised_as_transport_error_with_body(self):
+        response = SimpleNamespace(status_code=500, headers={}, content=b"<Fault/>", reason="Internal Server Error")
+        with self.assertRaises(TransportError) as context:
+            self._send(return_value=response)
+        self.assertEqual(500, context.exception.httpcode)
+        self.assertEqual(b"<Fault/>", context.exception.fp.read())
+
+    def test_gateway_timeout_is_raised_as_url_error(self):
+        response = SimpleNamespace(status_code=504, headers={}, content=b"<html/>", reason="Gateway Timeout")
+        with self.assertRaises(urllib.error.URLError):
+            self._send(return_value=response)
+
+    def test_connection_error_is_raised_as_url_error(self):
+        with self.assertRaises(urllib.error.URLError):
+            self._send(side_effect=requests.ConnectionError("refused"))
+
+    def test_options_timeout_is_used_if_request_has_none(self):
+        session = mock.Mock(spec=requests.Session)
+        session.post.return_value = SimpleNamespace(status_code=200, headers={}, content=b"<Reply/>", reason="OK")
+        transport = SessionTransport(session)
+
+        transport.send(Request("https://example.com/Service.svc", b"<Envelope/>"))
+
+        self.assertEqual(transport.options.timeout, session.post.call_args.kwargs["timeout"])
+        self.assertTrue(transport.options.timeout)
+
+    def test_throttled_call_is_retried(self):
+        throttled = SimpleNamespace(status_code=500, headers={}, reason="Internal Server Error",
+                                    content=b"<AdApiError><Code>117</Code><ErrorCode>CallRateExceeded</ErrorCode>")
+        response = SimpleNamespace(status_code=200, headers={}, content=b"<Reply/>", reason="OK")
+        rate_limiter = mock.Mock(spec=RateLimiter)
+        reply = self._send(rate_limiters=[rate_limiter], side_effect=[throttled, response])
+        self.assertEqual(b"<Reply/>", reply.message)
+        self.assertEqual(2, rate_limiter.acquire.call_count)
+        rate_limiter.on_throttled.assert_called_once()
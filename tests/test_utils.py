@@ -0,0 +1,75 @@
+import csv
+import gzip
+import io
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from bingads_wrapper import utils
+from bingads_wrapper.utils import gzip_compress_file_parallel, split_csv_files_into_slices
+
+
+class TestSplitCsvFilesIntoSlices(unittest.TestCase):
+
+    def test_slices_are_cut_at_row_boundaries_only(self):
+        rows = [[str(i), f"multi\nline \"{i}\"\r\nvalue", "x" * (i % 50)] for i in range(2000)]
+        contents = []
+        with tempfile.TemporaryDirectory() as directory:
+            src_paths = []
+            for part in range(3):
+                buffer = io.StringIO()
+                csv.writer(buffer, quoting=csv.QUOTE_ALL).writerows(rows[part::3])
+                contents.append(buffer.getvalue().encode())
+                src_paths.append(os.path.join(directory, f"src_{part}.csv"))
+                with open(src_paths[-1], 'wb') as f:
+                    f.write(contents[-1])
+
+            # small read blocks make rows and quoted values span block boundaries
+            with mock.patch.object(utils, "COPY_BUFFER_SIZE", 1000):
+                slice_paths = split_csv_files_into_slices(src_paths, os.path.join(directory, "out"),
+                                                          "table.csv", slice_size=10000)
+
+            self.assertGreater(len(slice_paths), 5)
+            sliced_rows = []
+            data = b""
+            for slice_path in slice_paths:
+                with open(slice_path, 'rb') as f:
+                    slice_content = f.read()
+                self.assertLess(len(slice_content), 10000 + 200)
+                data += slice_content
+                sliced_rows.extend(csv.reader(io.StringIO(slice_content.decode(), newline="")))
+
+        self.assertEqual(b"".join(contents), data)
+        self.assertEqual(sorted(rows, key=lambda r: int(r[0])), sorted(sliced_rows, key=lambda r: int(r[0])))
+
+
+class TestGzipCompressFileParallel(unittest.TestCase):
+
+    def test_compressed_file_decompresses_to_the_source(self):
+        block_size = 1000
+        contents = {
+            "empty": b"",
+            "smaller_than_block": b'"2024-01-01","1"\r\n',
+            # more blocks than are held in memory at once, the last one is partial
+            "multiple_blocks": b"".join(b'"%d","%s"\r\n' % (i, os.urandom(8).hex().encode()) for i in range(2000)),
+        }
+        with tempfile.TemporaryDirectory() as directory:
+            for name, content in contents.items():
+                with self.subTest(name):
+                    src_path, dst_path = os.path.join(directory, name), os.path.join(directory, f"{name}.gz")
+                    with open(src_path, 'wb') as f:
+                        f.write(content)
+
+                    gzip_compress_file_parallel(src_path, dst_path, workers=2, block_size=block_size)
+
+                    with gzip.open(dst_path, 'rb') as f:
+                        self.assertEqual(content, f.read())
+                    with open(dst_path, 'rb') as f:
+                        # every block is a separate gzip member
+                        member_count = f.read().count(b"\x1f\x8b\x08")
+                    self.assertGreaterEqual(member_count, -(-len(content) // block_size))
+
+
+if __name__ == "__main__":
+    unittest.main()